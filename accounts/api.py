@@ -1,7 +1,28 @@
 from rest_framework import serializers, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import User, FollowRequest
+from blocks.cache import blocked_user_ids, exclude_blocked
+from pixessa.cache import cached_response
+from pixessa.conditional import conditional, validators
+from pixessa.serializers import SparseFieldsMixin
+from .graph import follow_graph
+from .models import User, FollowRequest, Suggestion
+from .search import user_search_index
+
+
+BULK_LIMIT = 200
+
+
+def id_list(request, key):
+    """Read a list of integer ids from the request body, capped at BULK_LIMIT."""
+    ids = request.data.get(key)
+    if not isinstance(ids, list) or len(ids) > BULK_LIMIT:
+        raise ValidationError({key: f'Expected a list of at most {BULK_LIMIT} ids.'})
+    try:
+        return list({int(pk) for pk in ids})
+    except (TypeError, ValueError):
+        raise ValidationError({key: 'Ids must be integers.'})
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -45,11 +66,56 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'email', 'bio', 'profile_picture', 'is_private',
+            'followers_count', 'following_count', 'posts_count'
+        ]
+        read_only_fields = fields
+
+
+class SuggestionSerializer(serializers.ModelSerializer):
+    user = UserSerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = Suggestion
+        fields = ['user', 'score']
+
+
+def profile_dependencies(view):
+    return [('user', view.kwargs['pk']), ('blocks', view.request.user.pk or 0)]
+
+
+def profile_validator(view):
+    try:
+        updated_at = view.get_queryset().filter(pk=view.kwargs['pk']).values_list('updated_at', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+    if updated_at is None:
+        return None
+    return validators(profile_dependencies(view), [updated_at])
+
+
+class UserViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return exclude_blocked(User.objects.all(), self.request.user, field='id')
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return UserProfileSerializer
+        return UserSerializer
+
+    @conditional(profile_validator)
+    @cached_response('user-profile', profile_dependencies)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=['post'])
     def follow(self, request, pk=None):
         user_to_follow = self.get_object()
@@ -60,15 +126,58 @@ class UserViewSet(viewsets.ModelViewSet):
             FollowRequest.objects.get_or_create(requester=request.user, receiver=user_to_follow)
             return Response({'status': 'follow request sent'})
         else:
-            request.user.following.add(user_to_follow)
+            User.objects.follow(request.user, user_to_follow)
             return Response({'status': 'following'})
 
     @action(detail=True, methods=['post'])
     def unfollow(self, request, pk=None):
         user_to_unfollow = self.get_object()
-        request.user.following.remove(user_to_unfollow)
+        User.objects.unfollow(request.user, user_to_unfollow)
         return Response({'status': 'unfollowed'})
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_follow(self, request):
+        blocked = blocked_user_ids(request.user)
+        user_ids = [pk for pk in id_list(request, 'user_ids') if pk not in blocked]
+        followed, requested = User.objects.bulk_follow(request.user, user_ids)
+        return Response({'following': followed, 'requested': requested})
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk_unfollow(self, request):
+        unfollowed = User.objects.bulk_unfollow(request.user, id_list(request, 'user_ids'))
+        return Response({'unfollowed': unfollowed})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        graph = follow_graph()
+        followed_ids = graph.following(request.user.pk) if request.user.is_authenticated else None
+        ids = user_search_index().search(
+            request.query_params.get('q', ''),
+            limit=limit,
+            follower_counts=graph.follower_counts,
+            followed_ids=followed_ids,
+            exclude=blocked_user_ids(request.user),
+        )
+        users = User.objects.in_bulk(ids)
+        users = [users[pk] for pk in ids if pk in users]
+        return Response(self.get_serializer(users, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def suggestions(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = exclude_blocked(Suggestion.objects.filter(user=request.user), request.user, field='suggested')
+        if self.expanded('user'):
+            suggestions = suggestions.select_related('suggested')
+        suggestions = suggestions.order_by('-score')[:limit]
+        return Response(self.sparse(SuggestionSerializer(suggestions, many=True, context={'request': request})).data)
+
 
 class FollowRequestSerializer(serializers.ModelSerializer):
     class Meta:
@@ -76,7 +185,7 @@ class FollowRequestSerializer(serializers.ModelSerializer):
         fields = ['id', 'requester', 'receiver', 'status', 'created_at']
 
 
-class FollowRequestViewSet(viewsets.ModelViewSet):
+class FollowRequestViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = FollowRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -86,9 +195,7 @@ class FollowRequestViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         follow_request = self.get_object()
-        follow_request.status = 'accepted'
-        follow_request.save()
-        follow_request.requester.following.add(follow_request.receiver)
+        FollowRequest.objects.accept_request(follow_request)
         return Response({'status': 'request approved'})
 
     @action(detail=True, methods=['post'])
@@ -97,3 +204,13 @@ class FollowRequestViewSet(viewsets.ModelViewSet):
         follow_request.status = 'rejected'
         follow_request.save()
         return Response({'status': 'request rejected'})
+
+    @action(detail=False, methods=['post'])
+    def bulk_approve(self, request):
+        approved = FollowRequest.objects.bulk_accept(request.user, id_list(request, 'ids'))
+        return Response({'approved': approved})
+
+    @action(detail=False, methods=['post'])
+    def bulk_reject(self, request):
+        rejected = FollowRequest.objects.bulk_reject(request.user, id_list(request, 'ids'))
+        return Response({'rejected': rejected})
@@ -0,0 +1,290 @@
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from pixessa.snapshots import Snapshot
+
+
+def _csr(rows, cols, n):
+    """Build CSR arrays for `n` nodes from edge endpoints given as dense indices."""
+    # Sorting packed (row, col) keys is much cheaper than an argsort.
+    keys = rows.astype(np.int64) * n + cols
+    keys.sort()
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+    return indptr, (keys % n).astype(np.int32)
+
+
+def _gather(indptr, indices, nodes):
+    """Concatenate the adjacency slices of `nodes`, returning (sources, targets)."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return np.repeat(nodes, lengths), indices[offsets + np.arange(total)]
+
+
+class FollowGraph:
+    """
+    Read-optimised follow graph.
+
+    Edges are held as CSR adjacency arrays in both directions over dense node
+    indices, with sorted neighbour lists so membership is a binary search.
+    Follow/unfollow events since the last build are kept in small per-user
+    delta sets and folded into the arrays by `compact()`.
+    """
+
+    def __init__(self, user_ids, out_indptr, out_indices, in_indptr, in_indices):
+        self.user_ids = user_ids
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._reset_deltas()
+
+    def _reset_deltas(self):
+        self._added_out = defaultdict(set)
+        self._added_in = defaultdict(set)
+        self._removed_out = defaultdict(set)
+        self._removed_in = defaultdict(set)
+        self._delta_size = 0
+
+    @classmethod
+    def from_edges(cls, followers, followed):
+        """Build from two parallel arrays of user ids: followers[i] follows followed[i]."""
+        followers = np.asarray(followers, dtype=np.int64)
+        followed = np.asarray(followed, dtype=np.int64)
+        # Primary keys are dense enough that a lookup table beats sorting for the id mapping.
+        present = np.zeros(int(max(followers.max(initial=0), followed.max(initial=0))) + 1, dtype=bool)
+        present[followers] = True
+        present[followed] = True
+        user_ids = np.flatnonzero(present)
+        n = len(user_ids)
+        dense = np.zeros(len(present), dtype=np.int64)
+        dense[user_ids] = np.arange(n)
+        src, dst = dense[followers], dense[followed]
+        return cls(user_ids, *_csr(src, dst, n), *_csr(dst, src, n))
+
+    @classmethod
+    def load(cls):
+        from .models import User
+
+        edges = User.followers.through.objects.values_list('to_user_id', 'from_user_id')
+        edges = np.array(list(edges.iterator(chunk_size=50000)), dtype=np.int64).reshape(-1, 2)
+        return cls.from_edges(edges[:, 0], edges[:, 1])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (
+            self.user_ids, self.out_indptr, self.out_indices, self.in_indptr, self.in_indices
+        ))
+
+    def dense_indices(self, user_ids):
+        """Dense node index of each id, or -1 for users without any follow edges."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(self.user_ids):
+            return np.full(len(user_ids), -1, dtype=np.int64)
+        idx = np.searchsorted(self.user_ids, user_ids).clip(max=len(self.user_ids) - 1)
+        return np.where(self.user_ids[idx] == user_ids, idx, -1)
+
+    def _index(self, user_id):
+        i = np.searchsorted(self.user_ids, user_id)
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return int(i)
+        return None
+
+    def _indices(self, user_ids):
+        idx = self.dense_indices(user_ids)
+        return idx[idx >= 0]
+
+    def _base_has_edge(self, follower_id, followed_id):
+        a, b = self._index(follower_id), self._index(followed_id)
+        if a is None or b is None:
+            return False
+        row = self.out_indices[self.out_indptr[a]:self.out_indptr[a + 1]]
+        pos = np.searchsorted(row, b)
+        return bool(pos < len(row) and row[pos] == b)
+
+    def _base_neighbours(self, indptr, indices, user_id):
+        i = self._index(user_id)
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        return self.user_ids[indices[indptr[i]:indptr[i + 1]]]
+
+    def _merge(self, base, added, removed):
+        if removed:
+            base = base[~np.isin(base, np.fromiter(removed, dtype=np.int64))]
+        if added:
+            base = np.union1d(base, np.fromiter(added, dtype=np.int64))
+        return base
+
+    # Events
+
+    def add_edge(self, follower_id, followed_id):
+        with self._lock:
+            if followed_id in self._removed_out.get(follower_id, ()):
+                self._removed_out[follower_id].discard(followed_id)
+                self._removed_in[followed_id].discard(follower_id)
+                self._delta_size -= 1
+            elif not self._base_has_edge(follower_id, followed_id) \
+                    and followed_id not in self._added_out.get(follower_id, ()):
+                self._added_out[follower_id].add(followed_id)
+                self._added_in[followed_id].add(follower_id)
+                self._delta_size += 1
+            self._maybe_compact()
+
+    def remove_edge(self, follower_id, followed_id):
+        with self._lock:
+            if followed_id in self._added_out.get(follower_id, ()):
+                self._added_out[follower_id].discard(followed_id)
+                self._added_in[followed_id].discard(follower_id)
+                self._delta_size -= 1
+            elif self._base_has_edge(follower_id, followed_id) \
+                    and followed_id not in self._removed_out.get(follower_id, ()):
+                self._removed_out[follower_id].add(followed_id)
+                self._removed_in[followed_id].add(follower_id)
+                self._delta_size += 1
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._delta_size > max(settings.FOLLOW_GRAPH_MAX_DELTA, len(self.out_indices) // 100):
+            self.compact()
+
+    def compact(self):
+        """Fold the pending deltas into fresh CSR arrays."""
+        with self._lock:
+            src, dst = _gather(self.out_indptr, self.out_indices, np.arange(len(self.user_ids)))
+            followers, followed = self.user_ids[src], self.user_ids[dst]
+            removed = [(a, b) for a, targets in self._removed_out.items() for b in targets]
+            if removed:
+                removed = np.array(removed, dtype=np.int64)
+                n = int(max(followed.max(initial=0), removed[:, 1].max())) + 1
+                keep = ~np.isin(followers * n + followed, removed[:, 0] * n + removed[:, 1])
+                followers, followed = followers[keep], followed[keep]
+            added = [(a, b) for a, targets in self._added_out.items() for b in targets]
+            if added:
+                added = np.array(added, dtype=np.int64)
+                followers = np.concatenate((followers, added[:, 0]))
+                followed = np.concatenate((followed, added[:, 1]))
+            fresh = FollowGraph.from_edges(followers, followed)
+            self.user_ids = fresh.user_ids
+            self.out_indptr, self.out_indices = fresh.out_indptr, fresh.out_indices
+            self.in_indptr, self.in_indices = fresh.in_indptr, fresh.in_indices
+            self._reset_deltas()
+
+    # Queries
+
+    def is_following(self, follower_id, followed_id):
+        with self._lock:
+            if followed_id in self._added_out.get(follower_id, ()):
+                return True
+            if followed_id in self._removed_out.get(follower_id, ()):
+                return False
+            return self._base_has_edge(follower_id, followed_id)
+
+    def _degree(self, indptr, added, removed, user_id):
+        i = self._index(user_id)
+        base = int(indptr[i + 1] - indptr[i]) if i is not None else 0
+        return base + len(added.get(user_id, ())) - len(removed.get(user_id, ()))
+
+    def follower_count(self, user_id):
+        with self._lock:
+            return self._degree(self.in_indptr, self._added_in, self._removed_in, user_id)
+
+    def follower_counts(self, user_ids):
+        """Vectorised follower_count for an array of ids."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        with self._lock:
+            idx = self.dense_indices(user_ids)
+            found = idx >= 0
+            counts = np.zeros(len(user_ids), dtype=np.int64)
+            counts[found] = self.in_indptr[idx[found] + 1] - self.in_indptr[idx[found]]
+            if self._delta_size:
+                touched = np.fromiter(self._added_in.keys() | self._removed_in.keys(), dtype=np.int64)
+                for i in np.flatnonzero(np.isin(user_ids, touched)).tolist():
+                    user_id = int(user_ids[i])
+                    counts[i] += len(self._added_in.get(user_id, ())) - len(self._removed_in.get(user_id, ()))
+            return counts
+
+    def following_count(self, user_id):
+        with self._lock:
+            return self._degree(self.out_indptr, self._added_out, self._removed_out, user_id)
+
+    def followers(self, user_id):
+        """Sorted array of the ids following `user_id`."""
+        with self._lock:
+            base = self._base_neighbours(self.in_indptr, self.in_indices, user_id)
+            return self._merge(base, self._added_in.get(user_id), self._removed_in.get(user_id))
+
+    def following(self, user_id):
+        """Sorted array of the ids `user_id` follows."""
+        with self._lock:
+            base = self._base_neighbours(self.out_indptr, self.out_indices, user_id)
+            return self._merge(base, self._added_out.get(user_id), self._removed_out.get(user_id))
+
+    def mutuals(self, user_id):
+        """Ids that `user_id` follows and that follow them back."""
+        return np.intersect1d(self.following(user_id), self.followers(user_id), assume_unique=True)
+
+    def k_hop(self, user_id, k=2):
+        """Ids reachable from `user_id` by following at most `k` edges, excluding `user_id`."""
+        with self._lock:
+            seen = np.array([user_id], dtype=np.int64)
+            frontier = seen
+            for _ in range(k):
+                src, dst = _gather(self.out_indptr, self.out_indices, self._indices(frontier))
+                reached = self.user_ids[dst]
+                if self._delta_size:
+                    sources = self.user_ids[src]
+                    reached = self._apply_deltas(frontier, sources, reached)
+                frontier = np.setdiff1d(reached, seen)
+                if not len(frontier):
+                    break
+                seen = np.union1d(seen, frontier)
+            return seen[seen != user_id]
+
+    def _apply_deltas(self, frontier, sources, reached):
+        touched = [u for u in frontier.tolist() if u in self._removed_out or u in self._added_out]
+        if not touched:
+            return reached
+        keep = np.ones(len(reached), dtype=bool)
+        extra = []
+        for u in touched:
+            removed = self._removed_out.get(u)
+            if removed:
+                keep &= ~((sources == u) & np.isin(reached, np.fromiter(removed, dtype=np.int64)))
+            extra.extend(self._added_out.get(u, ()))
+        return np.concatenate((reached[keep], np.array(extra, dtype=np.int64)))
+
+
+_graph = Snapshot('follow-graph', FollowGraph.load, 'FOLLOW_GRAPH_MAX_AGE')
+
+
+def follow_graph():
+    """
+    Return this process's follow graph. It is built from the database on first
+    use, and rebuilt in the background once older than FOLLOW_GRAPH_MAX_AGE
+    seconds to pick up follows made by other processes.
+    """
+    return _graph.get()
+
+
+def warm_graph():
+    _graph.warm()
+
+
+def loaded_graph():
+    """The graph if this process has built one, without triggering a build."""
+    return _graph.value
+
+
+def reset_graph():
+    _graph.reset()
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts.graph import FollowGraph
+from pixessa.bench import measure
+
+
+class Command(BaseCommand):
+    help = 'Benchmark FollowGraph build time, memory and query latency on a synthetic graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edges', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        users, edges = options['users'], options['edges']
+        # Followers are uniform; popularity is heavy-tailed like a real follow graph.
+        sample_size = int(edges * 1.5)
+        followers = rng.integers(1, users + 1, size=sample_size)
+        followed = np.minimum(rng.zipf(1.3, size=sample_size), users)
+        followed = (followed * 7919 + 13) % users + 1
+        pairs = np.unique(followers * (users + 1) + followed)
+        pairs = pairs[pairs // (users + 1) != pairs % (users + 1)]
+        pairs = pairs[rng.permutation(len(pairs))[:edges]]
+        followers, followed = pairs // (users + 1), pairs % (users + 1)
+
+        start = time.perf_counter()
+        graph = FollowGraph.from_edges(followers, followed)
+        build = time.perf_counter() - start
+        self.stdout.write(
+            f'{len(followers):,} edges over {len(graph.user_ids):,} users: '
+            f'built in {build:.2f}s, {graph.nbytes / 2**20:.1f} MiB'
+        )
+
+        sample = rng.choice(graph.user_ids, size=1000)
+        it = iter(range(10**9))
+
+        def pick():
+            return int(sample[next(it) % len(sample)])
+
+        hub = int(graph.user_ids[np.argmax(np.diff(graph.in_indptr))])
+        cases = [
+            ('is_following', lambda: graph.is_following(pick(), pick())),
+            ('follower_count', lambda: graph.follower_count(pick())),
+            ('following (list)', lambda: graph.following(pick())),
+            ('mutuals', lambda: graph.mutuals(pick())),
+            ('k_hop k=2', lambda: graph.k_hop(pick(), 2)),
+            ('follower_count (hub)', lambda: graph.follower_count(hub)),
+        ]
+        self.stdout.write(f'{"query":<24}{"best us":>10}{"median us":>12}')
+        for label, fn in cases:
+            best, median = measure(fn, number=200)
+            self.stdout.write(f'{label:<24}{best * 1000:>10.1f}{median * 1000:>12.1f}')
+
+        for i in range(1000):
+            graph.add_edge(pick(), pick())
+        start = time.perf_counter()
+        graph.compact()
+        self.stdout.write(f'compact after 1,000 deltas: {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts.search import UserSearchIndex
+from pixessa.bench import measure
+
+SYLLABLES = ['a', 'al', 'an', 'ar', 'be', 'ce', 'da', 'de', 'el', 'em', 'er', 'fa', 'ha', 'i', 'ka', 'la',
+             'li', 'ma', 'mi', 'na', 'ne', 'o', 'ra', 're', 'sa', 'se', 'ta', 'te', 'u', 'ya', 'ye', 'za']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark UserSearchIndex build time and prefix query latency on synthetic users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n = options['users']
+
+        def names(parts):
+            picks = rng.integers(0, len(SYLLABLES), size=(n, parts))
+            return [''.join(SYLLABLES[i] for i in row) for row in picks.tolist()]
+
+        first, last = names(2), names(3)
+        rows = [
+            (i + 1, f'{first[i]}{last[i]}{i % 1000}', first[i].title(), last[i].title())
+            for i in range(n)
+        ]
+        follower_counts = np.minimum(rng.zipf(1.5, size=n + 1), 10**7)
+        followed_ids = np.unique(rng.integers(1, n + 1, size=500))
+
+        start = time.perf_counter()
+        index = UserSearchIndex(rows)
+        self.stdout.write(f'{len(index):,} users indexed in {time.perf_counter() - start:.2f}s')
+
+        full_name = f'{rows[n // 2][2]} {rows[n // 2][3]}'
+        cases = [
+            ('1 char', 'a'),
+            ('2 chars', 'al'),
+            ('3 chars', 'ali'),
+            ('full name', full_name),
+        ]
+        self.stdout.write(f'{"query":<12}{"matches":>10}{"best ms":>10}{"median ms":>12}')
+        for label, prefix in cases:
+            matches = len(index.candidates(prefix))
+            best, median = measure(lambda: index.search(
+                prefix, limit=10, follower_counts=follower_counts.__getitem__, followed_ids=followed_ids,
+            ), number=50)
+            self.stdout.write(f'{label:<12}{matches:>10,}{best:>10.2f}{median:>12.2f}')
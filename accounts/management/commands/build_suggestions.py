@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from accounts.suggestions import build_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute "people you may know" suggestions for every user, or only for users whose edges changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only refresh users queued since the last run (and their followers).'
+        )
+        parser.add_argument('--top-k', type=int, help='Suggestions stored per user.')
+        parser.add_argument('--chunk-size', type=int, help='Users scored per sparse product.')
+
+    def handle(self, *args, **options):
+        refreshed = build_suggestions(
+            incremental=options['incremental'],
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Refreshed suggestions for {refreshed} users.'))
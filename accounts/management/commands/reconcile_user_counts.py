@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from accounts.models import User
+from posts.models import Post
+
+COUNTERS = ('followers_count', 'following_count', 'posts_count')
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized follower/following/post counts on User and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fixed = checked = 0
+        last_id = 0
+        while True:
+            users = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk').only('pk', *COUNTERS)[:chunk_size]
+            )
+            if not users:
+                break
+            last_id = users[-1].pk
+            checked += len(users)
+            fixed += self.reconcile(users)
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, fixed {fixed}.'))
+
+    def reconcile(self, users):
+        ids = [user.pk for user in users]
+        follows = User.followers.through.objects
+
+        def counts(queryset, field):
+            rows = queryset.filter(**{f'{field}__in': ids}).values(field).annotate(n=models.Count('*'))
+            return {row[field]: row['n'] for row in rows.order_by()}
+
+        actual = {
+            'followers_count': counts(follows.all(), 'from_user'),
+            'following_count': counts(follows.all(), 'to_user'),
+            'posts_count': counts(Post.objects.all(), 'user'),
+        }
+        drifted = []
+        for user in users:
+            changed = False
+            for field in COUNTERS:
+                value = actual[field].get(user.pk, 0)
+                if getattr(user, field) != value:
+                    setattr(user, field, value)
+                    changed = True
+            if changed:
+                drifted.append(user)
+        with transaction.atomic():
+            User.objects.bulk_update(drifted, COUNTERS)
+        return len(drifted)
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    Follow = User.followers.through
+
+    def count_of(queryset, field):
+        counts = queryset.filter(**{field: models.OuterRef('pk')}).values(field)
+        return Coalesce(models.Subquery(counts.annotate(n=models.Count('*')).values('n')), 0)
+
+    User.objects.update(
+        followers_count=count_of(Follow.objects.all(), 'from_user'),
+        following_count=count_of(Follow.objects.all(), 'to_user'),
+        posts_count=count_of(Post.objects.all(), 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_suggestions'),
+        ('posts', '0003_comment_hate_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
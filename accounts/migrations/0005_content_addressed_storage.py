@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:00
+
+import mediastore.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_picture',
+            field=models.ImageField(blank=True, storage=mediastore.storage.get_media_storage, upload_to='profile_pics/'),
+        ),
+    ]
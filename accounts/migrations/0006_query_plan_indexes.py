@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['receiver', 'status'], name='followreq_receiver_status_idx'),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.contrib.auth.models import AbstractUser
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 
 from django.contrib.auth.base_user import BaseUserManager
 
+from mediastore.storage import get_media_storage
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, username, password=None, **extra_fields):
@@ -39,6 +42,67 @@ class UserManager(BaseUserManager):
     def get_following(self, user):
         return user.following.all()
 
+    def adjust_count(self, user_ids, field, delta):
+        """Add `delta` to a denormalized counter column, never going below zero."""
+        if not isinstance(user_ids, (list, set, tuple)):
+            user_ids = [user_ids]
+        return self.filter(pk__in=user_ids).update(**{field: Greatest(models.F(field) + delta, 0)})
+
+    def follow(self, follower, followed):
+        """Make `follower` follow `followed`; returns False if they already did."""
+        with transaction.atomic():
+            if follower.following.filter(pk=followed.pk).exists():
+                return False
+            follower.following.add(followed)
+            self.adjust_count(follower.pk, 'following_count', 1)
+            self.adjust_count(followed.pk, 'followers_count', 1)
+        return True
+
+    def bulk_follow(self, follower, user_ids):
+        """
+        Follow many users at once. Public accounts get an edge straight away and
+        private ones a follow request; returns (followed ids, requested ids).
+        """
+        with transaction.atomic():
+            targets = dict(
+                self.filter(pk__in=user_ids).exclude(pk=follower.pk).values_list('pk', 'is_private')
+            )
+            already = set(follower.following.filter(pk__in=targets).values_list('pk', flat=True))
+            public = [pk for pk, private in targets.items() if not private and pk not in already]
+            private = [pk for pk, private in targets.items() if private and pk not in already]
+            if public:
+                # One INSERT OR IGNORE for all edges, which also fires m2m_changed.
+                follower.following.add(*public)
+                self.adjust_count(follower.pk, 'following_count', len(public))
+                self.adjust_count(public, 'followers_count', 1)
+            if private:
+                FollowRequest.objects.bulk_create(
+                    [FollowRequest(requester=follower, receiver_id=pk) for pk in private],
+                    ignore_conflicts=True,
+                )
+                SuggestionRefresh.objects.queue([follower.pk])
+        return public, private
+
+    def bulk_unfollow(self, follower, user_ids):
+        """Unfollow many users at once; returns the ids that were actually unfollowed."""
+        with transaction.atomic():
+            existing = list(follower.following.filter(pk__in=user_ids).values_list('pk', flat=True))
+            if existing:
+                follower.following.remove(*existing)
+                self.adjust_count(follower.pk, 'following_count', -len(existing))
+                self.adjust_count(existing, 'followers_count', -1)
+        return existing
+
+    def unfollow(self, follower, followed):
+        """Remove the follow edge; returns False if there was none."""
+        with transaction.atomic():
+            if not follower.following.filter(pk=followed.pk).exists():
+                return False
+            follower.following.remove(followed)
+            self.adjust_count(follower.pk, 'following_count', -1)
+            self.adjust_count(followed.pk, 'followers_count', -1)
+        return True
+
 
 class FollowRequestManager(models.Manager):
     def pending_requests(self, user):
@@ -52,15 +116,35 @@ class FollowRequestManager(models.Manager):
         ).exists()
 
     def accept_request(self, request):
-        request.status = 'accepted'
-        request.save()
-        request.requester.following.add(request.receiver)
-        request.receiver.followers.add(request.requester)
+        with transaction.atomic():
+            request.status = 'accepted'
+            request.save()
+            User.objects.follow(request.requester, request.receiver)
 
     def reject_request(self, request):
         request.status = 'rejected'
         request.save()
 
+    def bulk_accept(self, receiver, request_ids):
+        """Accept many pending requests to `receiver`; returns the number accepted."""
+        with transaction.atomic():
+            pending = self.filter(receiver=receiver, status='pending', pk__in=request_ids)
+            requester_ids = list(pending.values_list('requester_id', flat=True))
+            if not requester_ids:
+                return 0
+            self.filter(pk__in=request_ids, receiver=receiver, status='pending').update(status='accepted')
+            already = set(receiver.followers.filter(pk__in=requester_ids).values_list('pk', flat=True))
+            new = [pk for pk in requester_ids if pk not in already]
+            if new:
+                receiver.followers.add(*new)
+                User.objects.adjust_count(receiver.pk, 'followers_count', len(new))
+                User.objects.adjust_count(new, 'following_count', 1)
+        return len(requester_ids)
+
+    def bulk_reject(self, receiver, request_ids):
+        """Reject many pending requests to `receiver` in one UPDATE."""
+        return self.filter(receiver=receiver, status='pending', pk__in=request_ids).update(status='rejected')
+
 
 class User(AbstractUser):
     GENDER_CHOICES = [
@@ -71,13 +155,16 @@ class User(AbstractUser):
     ]
 
     bio = models.TextField(max_length=500, blank=True)
-    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', storage=get_media_storage, blank=True)
     website = models.URLField(blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True)
     is_private = models.BooleanField(default=True)
     verified = models.BooleanField(default=False)
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following', blank=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -103,6 +190,44 @@ class FollowRequest(models.Model):
 
     class Meta:
         unique_together = ('requester', 'receiver')
+        indexes = [
+            models.Index(fields=['receiver', 'status'], name='followreq_receiver_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.requester} -> {self.receiver} ({self.status})"
+
+
+class Suggestion(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested} suggested to {self.user} ({self.score:.2f})"
+
+
+class SuggestionRefreshManager(models.Manager):
+    def queue(self, user_ids):
+        """Mark users whose outgoing edges changed so the next incremental run recomputes them."""
+        self.bulk_create(
+            [self.model(user_id=user_id) for user_id in set(user_ids)],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['queued_at'],
+        )
+
+
+class SuggestionRefresh(models.Model):
+    """Users whose outgoing follow edges changed since the last suggestions run."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    objects = SuggestionRefreshManager()
@@ -0,0 +1,168 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+import numpy as np
+from django.conf import settings
+
+from pixessa.snapshots import Snapshot
+
+
+def search_keys(username, first_name='', last_name=''):
+    """Normalised strings a user can be found by: username, full name and last name."""
+    keys = {username.casefold()}
+    full_name = f'{first_name} {last_name}'.strip().casefold()
+    if full_name:
+        keys.add(full_name)
+    if last_name:
+        keys.add(last_name.strip().casefold())
+    return tuple(sorted(keys))
+
+
+class UserSearchIndex:
+    """
+    In-memory prefix index for mention autocomplete and user search.
+
+    Every user contributes a few normalised keys (see `search_keys`) to one
+    sorted list of (key, user_id) pairs, so all matches for a prefix are a
+    contiguous run found with a binary search. A parallel array of the ids
+    lets `search` rank the whole run with numpy. When a user is saved their
+    changed keys go to a small sorted side list and a set of removed pairs,
+    which are merged into the main list once USER_SEARCH_MAX_DELTA pile up.
+    """
+
+    def __init__(self, rows=()):
+        self._entries = {}
+        pairs = []
+        for user_id, username, first_name, last_name in rows:
+            keys = search_keys(username, first_name, last_name)
+            self._entries[user_id] = keys
+            pairs.extend((key, user_id) for key in keys)
+        pairs.sort()
+        self._pairs = pairs
+        self._ids = np.fromiter((user_id for _, user_id in pairs), dtype=np.int64, count=len(pairs))
+        self._added = []
+        self._removed = set()
+        self._removed_ids = None
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        from .models import User
+
+        rows = User.objects.filter(is_active=True).values_list('id', 'username', 'first_name', 'last_name')
+        return cls(rows.iterator(chunk_size=10000))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, user_id, username, first_name='', last_name=''):
+        keys = search_keys(username, first_name, last_name)
+        with self._lock:
+            old = self._entries.get(user_id, ())
+            if old == keys:
+                return
+            for key in set(old) - set(keys):
+                self._discard(key, user_id)
+            for key in set(keys) - set(old):
+                self._add(key, user_id)
+            self._entries[user_id] = keys
+            self._compact_if_due()
+
+    def remove(self, user_id):
+        with self._lock:
+            for key in self._entries.pop(user_id, ()):
+                self._discard(key, user_id)
+            self._compact_if_due()
+
+    def _add(self, key, user_id):
+        pair = (key, user_id)
+        if pair in self._removed:
+            self._removed.discard(pair)
+            self._removed_ids = None
+        else:
+            insort(self._added, pair)
+
+    def _discard(self, key, user_id):
+        pair = (key, user_id)
+        i = bisect_left(self._added, pair)
+        if i < len(self._added) and self._added[i] == pair:
+            del self._added[i]
+        else:
+            self._removed.add(pair)
+            self._removed_ids = None
+
+    def _compact_if_due(self):
+        if len(self._added) + len(self._removed) <= settings.USER_SEARCH_MAX_DELTA:
+            return
+        # Build new lists rather than editing in place: `candidates` may hold slices of the old ones.
+        pairs = [pair for pair in self._pairs if pair not in self._removed]
+        self._pairs = list(heapq.merge(pairs, self._added))
+        self._ids = np.fromiter((user_id for _, user_id in self._pairs), dtype=np.int64, count=len(self._pairs))
+        self._added, self._removed, self._removed_ids = [], set(), None
+
+    def candidates(self, prefix, exclude=frozenset()):
+        """Sorted array of every id with a key starting with `prefix`."""
+        prefix = prefix.casefold().strip()
+        if not prefix:
+            return np.empty(0, dtype=np.int64)
+        end = prefix + '\U0010ffff'
+        with self._lock:
+            start = bisect_left(self._pairs, (prefix,))
+            stop = bisect_left(self._pairs, (end,), start)
+            ids = self._ids[start:stop]
+            if self._removed:
+                if self._removed_ids is None:
+                    self._removed_ids = np.fromiter({user_id for _, user_id in self._removed}, dtype=np.int64)
+                # Only ids with a removed pair need their key checked.
+                suspects = np.flatnonzero(np.isin(ids, self._removed_ids)).tolist()
+                ids = np.delete(ids, [i for i in suspects if self._pairs[start + i] in self._removed])
+            if self._added:
+                first = bisect_left(self._added, (prefix,))
+                added = [user_id for _, user_id in self._added[first:bisect_left(self._added, (end,), first)]]
+                ids = np.concatenate((ids, np.array(added, dtype=np.int64)))
+        ids = np.unique(ids)
+        if exclude:
+            ids = ids[~np.isin(ids, np.fromiter(exclude, dtype=np.int64, count=len(exclude)))]
+        return ids
+
+    def search(self, prefix, limit=10, follower_counts=None, followed_ids=None, exclude=frozenset()):
+        """
+        Best `limit` matches for `prefix`: people the viewer follows first, then
+        by follower count. `follower_counts` maps an id array to counts and
+        `followed_ids` is a sorted array of ids the viewer follows.
+        """
+        ids = self.candidates(prefix, exclude)
+        if not len(ids):
+            return []
+        counts = np.asarray(follower_counts(ids)) if follower_counts else np.zeros(len(ids), dtype=np.int64)
+        followed = np.isin(ids, followed_ids, assume_unique=True) if followed_ids is not None \
+            else np.zeros(len(ids), dtype=bool)
+        # Only followed matches and the rest down to the limit-th highest count
+        # can make the cut, so a short prefix doesn't sort every match.
+        rest = counts[~followed]
+        if len(rest) > limit:
+            threshold = np.partition(rest, len(rest) - limit)[len(rest) - limit]
+            keep = followed | (counts >= threshold)
+            ids, counts, followed = ids[keep], counts[keep], followed[keep]
+        # lexsort uses the last key as the primary one.
+        order = np.lexsort((ids, -counts, ~followed))
+        return ids[order[:limit]].tolist()
+
+
+_index = Snapshot('user-search-index', UserSearchIndex.load, 'USER_SEARCH_MAX_AGE')
+
+
+def user_search_index():
+    """This process's index, rebuilt in the background after USER_SEARCH_MAX_AGE seconds to pick up other workers' writes."""
+    return _index.get()
+
+
+def warm_index():
+    _index.warm()
+
+
+def loaded_index():
+    return _index.value
@@ -0,0 +1,85 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from blocks.models import Block
+from pixessa.cache import bump
+from .graph import loaded_graph, reset_graph
+from .models import FollowRequest, SuggestionRefresh, User
+from .search import loaded_index
+
+
+def follow_edges(instance, reverse, pk_set):
+    """Turn an m2m_changed payload on User.followers into (follower_id, followed_id) pairs."""
+    if reverse:
+        # instance.following.add(...) / .remove(...)
+        return [(instance.pk, pk) for pk in pk_set]
+    # instance.followers.add(...) / .remove(...)
+    return [(pk, instance.pk) for pk in pk_set]
+
+
+def _apply_to_graph(action, edges):
+    graph = loaded_graph()
+    if graph is None:
+        return
+    for follower_id, followed_id in edges:
+        if action == 'post_add':
+            graph.add_edge(follower_id, followed_id)
+        else:
+            graph.remove_edge(follower_id, followed_id)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def update_follow_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear':
+        transaction.on_commit(reset_graph)
+        SuggestionRefresh.objects.queue([instance.pk])
+        bump('user', instance.pk)
+        bump('following', instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        edges = follow_edges(instance, reverse, pk_set)
+        # Follower counts on both profiles and the follower's author_followed flags.
+        bump('user', *{user_id for edge in edges for user_id in edge})
+        bump('following', *{follower_id for follower_id, _ in edges})
+        transaction.on_commit(partial(_apply_to_graph, action, edges))
+        SuggestionRefresh.objects.queue(follower_id for follower_id, _ in edges)
+
+
+@receiver(post_save, sender=FollowRequest)
+def refresh_requester_suggestions(sender, instance, created, **kwargs):
+    if created:
+        SuggestionRefresh.objects.queue([instance.requester_id])
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def refresh_blocked_suggestions(sender, instance, **kwargs):
+    SuggestionRefresh.objects.queue([instance.blocker_id, instance.blocked_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    bump('user', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_search_index(sender, instance, **kwargs):
+    index = loaded_index()
+    if index is None:
+        return
+    if instance.is_active:
+        transaction.on_commit(partial(
+            index.update, instance.pk, instance.username, instance.first_name, instance.last_name
+        ))
+    else:
+        transaction.on_commit(partial(index.remove, instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def remove_from_search_index(sender, instance, **kwargs):
+    index = loaded_index()
+    if index is not None:
+        transaction.on_commit(partial(index.remove, instance.pk))
@@ -0,0 +1,109 @@
+"""
+"People you may know" batch job.
+
+Suggestions are friends-of-friends scores computed with sparse matrix
+products over the follow graph: for a user u, (F @ F)[u, v] counts the
+people u follows who follow v, and people who already follow u get a
+smaller bonus. Existing follows, blocks (either direction), pending follow
+requests and inactive accounts are masked out, and the top-K per user are
+stored in Suggestion so the endpoint is a single indexed read.
+"""
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from blocks.models import Block
+from .graph import FollowGraph
+from .models import FollowRequest, Suggestion, SuggestionRefresh, User
+
+
+def _pair_matrix(graph, pairs):
+    """0/1 matrix over the graph's dense indices from (row user id, column user id) pairs."""
+    n = len(graph.user_ids)
+    pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+    rows, cols = graph.dense_indices(pairs[:, 0]), graph.dense_indices(pairs[:, 1])
+    keep = (rows >= 0) & (cols >= 0)
+    data = np.ones(int(keep.sum()), dtype=np.float32)
+    return sp.csr_matrix((data, (rows[keep], cols[keep])), shape=(n, n))
+
+
+def _top_k(scores, k):
+    """Yield (row, column indices, scores) of the k best entries in each row of a CSR matrix."""
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        if start == end:
+            continue
+        data, cols = scores.data[start:end], scores.indices[start:end]
+        if len(data) > k:
+            best = np.argpartition(-data, k)[:k]
+            data, cols = data[best], cols[best]
+        yield row, cols, data
+
+
+def build_suggestions(incremental=False, top_k=None, chunk_size=None):
+    """Recompute stored suggestions and return the number of users refreshed."""
+    top_k = top_k or settings.SUGGESTIONS_TOP_K
+    chunk_size = chunk_size or settings.SUGGESTIONS_CHUNK_SIZE
+    started_at = timezone.now()
+
+    graph = FollowGraph.load()
+    n = len(graph.user_ids)
+    follows = sp.csr_matrix(
+        (np.ones(len(graph.out_indices), dtype=np.float32), graph.out_indices, graph.out_indptr),
+        shape=(n, n),
+    )
+    followed_by = follows.T.tocsr()
+
+    if incremental:
+        queued = list(SuggestionRefresh.objects.filter(queued_at__lte=started_at).values_list('user_id', flat=True))
+        changed = graph.dense_indices(queued)
+        changed = changed[changed >= 0]
+        # A changed edge u -> v alters the two-hop paths of u and of everyone following u.
+        rows = np.union1d(changed, followed_by[changed].indices)
+        stale_users = set(queued) - set(graph.user_ids[rows].tolist())
+    else:
+        rows = np.arange(n)
+        stale_users = set(Suggestion.objects.values_list('user_id', flat=True).distinct()) \
+            - set(graph.user_ids.tolist())
+
+    blocks = Block.objects.values_list('blocker_id', 'blocked_id')
+    blocked = _pair_matrix(graph, blocks)
+    excluded = (
+        follows
+        + blocked + blocked.T
+        + _pair_matrix(graph, FollowRequest.objects.filter(status='pending').values_list('requester_id', 'receiver_id'))
+        + sp.identity(n, dtype=np.float32, format='csr')
+    )
+    excluded.data[:] = 1
+    active = np.ones(n, dtype=np.float32)
+    inactive = graph.dense_indices(User.objects.filter(is_active=False).values_list('id', flat=True))
+    active[inactive[inactive >= 0]] = 0
+    active = sp.diags(active)
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scores = follows[chunk] @ follows + settings.SUGGESTIONS_FOLLOWS_YOU_WEIGHT * followed_by[chunk]
+        scores = (scores - scores.multiply(excluded[chunk])) @ active
+        scores = sp.csr_matrix(scores)
+        scores.eliminate_zeros()
+
+        user_ids = graph.user_ids[chunk]
+        suggestions = [
+            Suggestion(user_id=int(user_ids[row]), suggested_id=int(graph.user_ids[col]), score=float(score))
+            for row, cols, data in _top_k(scores, top_k)
+            for col, score in zip(cols, data)
+        ]
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=user_ids.tolist()).delete()
+            Suggestion.objects.bulk_create(suggestions, batch_size=1000)
+
+    with transaction.atomic():
+        if stale_users:
+            Suggestion.objects.filter(user_id__in=stale_users).delete()
+        refreshed = SuggestionRefresh.objects.filter(queued_at__lte=started_at)
+        if incremental:
+            refreshed = refreshed.filter(user_id__in=queued)
+        refreshed.delete()
+    return len(rows)
@@ -1,3 +1,160 @@
-from django.test import TestCase
+import io
+import threading
+import time
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from pixessa.snapshots import Snapshot
+from posts.models import Post
+from .models import User
+from .search import UserSearchIndex
+
+USERS = [
+    (1, 'anna', 'Anna', 'Smith'),
+    (2, 'annabel', '', ''),
+    (3, 'andrew', 'Andrew', 'Annan'),
+    (4, 'bob', 'Bob', 'Anders'),
+    (5, 'carol', '', ''),
+]
+
+
+class UserSearchIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = UserSearchIndex(USERS)
+        followers = {1: 5, 2: 50, 3: 1, 4: 20, 5: 0}
+        self.follower_counts = lambda ids: [followers.get(user_id, 0) for user_id in ids.tolist()]
+
+    def search(self, prefix, **kwargs):
+        return self.index.search(prefix, follower_counts=self.follower_counts, **kwargs)
+
+    def test_prefix_ranks_by_follower_count(self):
+        # Matches usernames, full names and last names.
+        self.assertEqual(self.search('an'), [2, 4, 1, 3])
+        self.assertEqual(self.search('anna'), [2, 1, 3])
+        self.assertEqual(self.search('anna s'), [1])
+        self.assertEqual(self.search('ANDERS'), [4])
+
+    def test_followed_users_first(self):
+        self.assertEqual(self.search('an', followed_ids=np.array([3])), [3, 2, 4, 1])
+
+    def test_limit_and_exclude(self):
+        self.assertEqual(self.search('an', limit=2), [2, 4])
+        self.assertEqual(self.search('an', exclude=frozenset({2})), [4, 1, 3])
+
+    def assertMatchesRebuilt(self, users):
+        rebuilt = UserSearchIndex(users)
+        for prefix in ('a', 'an', 'ann', 'anna', 'b', 'c', 'z', 'smith'):
+            self.assertEqual(
+                self.index.candidates(prefix).tolist(), rebuilt.candidates(prefix).tolist(), prefix,
+            )
+
+    def test_updates_match_a_rebuilt_index(self):
+        for max_delta in (0, 1000):
+            with self.subTest(max_delta=max_delta), override_settings(USER_SEARCH_MAX_DELTA=max_delta):
+                self.index = UserSearchIndex(USERS)
+                self.index.update(5, 'carol', 'Carol', 'Annan')
+                self.index.update(1, 'anna', '', '')
+                self.index.update(6, 'zed', '', '')
+                self.index.remove(2)
+                self.index.update(1, 'anna', 'Anna', 'Smith')
+                self.assertMatchesRebuilt([
+                    (1, 'anna', 'Anna', 'Smith'),
+                    (3, 'andrew', 'Andrew', 'Annan'),
+                    (4, 'bob', 'Bob', 'Anders'),
+                    (5, 'carol', 'Carol', 'Annan'),
+                    (6, 'zed', '', ''),
+                ])
+
+
+class Built:
+    def __init__(self, generation):
+        self.generation = generation
+        self.built_at = time.monotonic()
+
+
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.generation = 0
+        self.release = threading.Event()
+        self.rebuilt = threading.Event()
+
+    def load(self):
+        self.generation += 1
+        if self.generation > 1:
+            self.release.wait(5)
+            self.rebuilt.set()
+        return Built(self.generation)
+
+    @override_settings(TEST_SNAPSHOT_MAX_AGE=0)
+    def test_serves_stale_copy_while_rebuilding(self):
+        snapshot = Snapshot('test', self.load, 'TEST_SNAPSHOT_MAX_AGE')
+        self.assertEqual(snapshot.get().generation, 1)
+        # Stale: the rebuild blocks in the background and requests keep the old copy.
+        self.assertEqual(snapshot.get().generation, 1)
+        self.assertEqual(snapshot.get().generation, 1)
+        self.release.set()
+        self.assertTrue(self.rebuilt.wait(5))
+        for _ in range(100):
+            if snapshot.value.generation == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(snapshot.value.generation, 2)
+        self.assertEqual(self.generation, 2)
+
+
+class UserCountTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create_user(email='me@example.com', username='me', password='x')
+        self.others = [
+            User.objects.create_user(email=f'u{i}@example.com', username=f'u{i}', password='x', is_private=False)
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def assertCounts(self, user, followers=0, following=0, posts=0):
+        user.refresh_from_db()
+        self.assertEqual((user.followers_count, user.following_count, user.posts_count), (followers, following, posts))
+
+    def test_follow_and_unfollow(self):
+        first = self.others[0]
+        for _ in range(2):
+            self.client.post(f'/api/users/{first.pk}/follow/')
+        self.assertCounts(self.me, following=1)
+        self.assertCounts(first, followers=1)
+        for _ in range(2):
+            self.client.post(f'/api/users/{first.pk}/unfollow/')
+        self.assertCounts(self.me)
+        self.assertCounts(first)
+
+    def test_bulk_follow_and_unfollow(self):
+        ids = [user.pk for user in self.others]
+        self.client.post('/api/users/bulk_follow/', {'user_ids': ids}, format='json')
+        self.client.post('/api/users/bulk_follow/', {'user_ids': ids}, format='json')
+        self.assertCounts(self.me, following=3)
+        for user in self.others:
+            self.assertCounts(user, followers=1)
+        self.client.post('/api/users/bulk_unfollow/', {'user_ids': ids[:2]}, format='json')
+        self.assertCounts(self.me, following=1)
+        self.assertCounts(self.others[0])
+        self.assertCounts(self.others[2], followers=1)
+
+    def test_post_create_and_delete(self):
+        response = self.client.post('/api/posts/', {'caption': 'hello'})
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/api/posts/', {'caption': 'again'})
+        self.assertCounts(self.me, posts=2)
+        self.client.delete(f"/api/posts/{response.data['id']}/")
+        self.assertCounts(self.me, posts=1)
+
+    def test_reconcile_fixes_drift(self):
+        self.me.following.add(self.others[0])
+        Post.objects.create(user=self.me, caption='direct')
+        User.objects.filter(pk=self.others[1].pk).update(followers_count=5)
+        call_command('reconcile_user_counts', stdout=io.StringIO())
+        self.assertCounts(self.me, following=1, posts=1)
+        self.assertCounts(self.others[0], followers=1)
+        self.assertCounts(self.others[1])
@@ -1,6 +1,7 @@
-from rest_framework import serializers, viewsets, permissions
+from rest_framework import mixins, serializers, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from .cache import invalidate
 from .models import Block
 
 
@@ -11,7 +12,9 @@ class BlockSerializer(serializers.ModelSerializer):
         read_only_fields = ['blocker']
 
 
-class BlockViewSet(viewsets.ModelViewSet):
+class BlockViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                   mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """A user's blocks. There is no update: block and unblock instead, so `invalidate` sees both users."""
     serializer_class = BlockSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = Block.objects.none()
@@ -20,10 +23,15 @@ class BlockViewSet(viewsets.ModelViewSet):
         return Block.objects.filter(blocker=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(blocker=self.request.user)
+        block = serializer.save(blocker=self.request.user)
+        invalidate(block.blocker_id, block.blocked_id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate(instance.blocker_id, instance.blocked_id)
 
     @action(detail=True, methods=['post'])
     def unblock(self, request, pk=None):
         block = self.get_object()
-        block.delete()
-        return Response({'status': 'user unblocked'})
\ No newline at end of file
+        self.perform_destroy(block)
+        return Response({'status': 'user unblocked'})
@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from pixessa.cache import bump, version
+from .models import Block
+
+_block_sets = OrderedDict()
+_lock = threading.Lock()
+
+
+def invalidate(*user_ids):
+    """Bump the block-set version of each user so every process reloads it."""
+    bump('blocks', *user_ids)
+
+
+def blocked_user_ids(user):
+    """
+    Ids of the users hidden from `user` in both directions (people they blocked
+    and people who blocked them).
+
+    Sets are kept per process and revalidated against a version number in the
+    database (see pixessa.cache), so a lookup costs one indexed read unless
+    the set changed. They are also reloaded after BLOCK_SET_MAX_AGE seconds.
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    current = version('blocks', user.pk)
+    now = time.monotonic()
+    with _lock:
+        cached = _block_sets.get(user.pk)
+        if cached and cached[0] == current and now - cached[2] < settings.BLOCK_SET_MAX_AGE:
+            _block_sets.move_to_end(user.pk)
+            return cached[1]
+
+    ids = frozenset(Block.objects.related_user_ids(user))
+    with _lock:
+        _block_sets[user.pk] = (current, ids, now)
+        _block_sets.move_to_end(user.pk)
+        while len(_block_sets) > settings.BLOCK_SET_CACHE_SIZE:
+            _block_sets.popitem(last=False)
+    return ids
+
+
+def exclude_blocked(queryset, user, field='user'):
+    """Drop rows whose `field` points at a user blocked by or blocking `user`."""
+    ids = blocked_user_ids(user)
+    if not ids:
+        return queryset
+    return queryset.exclude(**{f'{field}__in': ids})
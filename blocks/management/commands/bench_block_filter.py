@@ -0,0 +1,66 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from blocks.cache import blocked_user_ids, exclude_blocked
+from blocks.models import Block
+from pixessa.bench import measure, scratch_data
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the overhead the block-set exclusion adds to the feed and comment queries. '
+        'Seeds synthetic data inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts-per-user', type=int, default=20)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--blocks', type=int, default=50)
+        parser.add_argument('--number', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_data():
+            viewer, post = self.seed(options)
+            following_ids = viewer.following.values_list('id', flat=True)
+            feed = Post.objects.filter(user__in=following_ids)
+            comments = Comment.objects.filter(post=post, is_offensive=False)
+            blocked_user_ids(viewer)  # warm the per-process set
+
+            cases = [
+                ('block set lookup (cached)', lambda: blocked_user_ids(viewer)),
+                ('feed, no filter', lambda: list(feed.order_by('-created_at')[:50])),
+                ('feed, block filter', lambda: list(
+                    exclude_blocked(feed, viewer).order_by('-created_at')[:50]
+                )),
+                ('comments, no filter', lambda: list(comments.all())),
+                ('comments, block filter', lambda: list(exclude_blocked(comments, viewer))),
+            ]
+            self.stdout.write(f'{"case":<30}{"best ms":>10}{"median ms":>12}')
+            for label, fn in cases:
+                best, median = measure(fn, number=options['number'])
+                self.stdout.write(f'{label:<30}{best:>10.3f}{median:>12.3f}')
+
+    def seed(self, options):
+        users = User.objects.bulk_create([
+            User(username=f'bench-block-{i}', email=f'bench-block-{i}@example.com')
+            for i in range(options['users'])
+        ])
+        viewer, others = users[0], users[1:]
+        viewer.following.add(*others)
+        Post.objects.bulk_create([
+            Post(user=user, caption=f'post {i} by {user.username}')
+            for user in others for i in range(options['posts_per_user'])
+        ], batch_size=1000)
+        post = Post.objects.filter(user__in=others).first()
+        Comment.objects.bulk_create([
+            Comment(post=post, user=random.choice(others), content=f'comment {i}')
+            for i in range(options['comments'])
+        ], batch_size=1000)
+        Block.objects.bulk_create([
+            Block(blocker=viewer, blocked=user) for user in random.sample(others, options['blocks'])
+        ])
+        return viewer, post
@@ -14,6 +14,13 @@ class BlockManager(models.Manager):
     def get_blockers(self, user):
         return self.filter(blocked=user).select_related('blocker')
 
+    def related_user_ids(self, user):
+        """Ids of everyone `user` blocks or is blocked by, in one query."""
+        pairs = self.filter(
+            models.Q(blocker=user) | models.Q(blocked=user)
+        ).values_list('blocker_id', 'blocked_id')
+        return {blocked if blocker == user.pk else blocker for blocker, blocked in pairs}
+
 
 class Block(models.Model):
     blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocking')
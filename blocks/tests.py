@@ -1,3 +1,72 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from posts.models import Comment, Post
+from .models import Block
+
+
+class BlockedUsersHiddenTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='x')
+        self.friend = User.objects.create_user(email='friend@example.com', username='friend', password='x', is_private=False)
+        self.pest = User.objects.create_user(email='pest@example.com', username='pest', password='x', is_private=False)
+        self.viewer.following.add(self.friend, self.pest)
+        self.post = Post.objects.create(user=self.friend, caption='sunset over the bay')
+        Post.objects.create(user=self.pest, caption='sunset from the pier')
+        comment = Comment.objects.create(post=self.post, user=self.pest, content='first')
+        Comment.objects.create(post=self.post, user=self.friend, content='reply', parent=comment)
+        Comment.objects.create(post=self.post, user=self.friend, content='second')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def block(self, blocker=None, blocked=None):
+        self.client.force_authenticate(blocker or self.viewer)
+        response = self.client.post('/api/blocks/', {'blocked': (blocked or self.pest).pk})
+        self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(self.viewer)
+        return response.data['id']
+
+    def authors(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        # Posts expand their author; comments name them by username.
+        return {item['user']['username'] if isinstance(item['user'], dict) else item['user'] for item in results}
+
+    def test_feed(self):
+        self.assertEqual(self.authors('/api/posts/feed/'), {'friend', 'pest'})
+        self.block()
+        self.assertEqual(self.authors('/api/posts/feed/'), {'friend'})
+
+    def test_comments(self):
+        self.assertIn('pest', self.authors(f'/api/posts/{self.post.pk}/comments/'))
+        self.block()
+        self.assertEqual(self.authors(f'/api/posts/{self.post.pk}/comments/'), {'friend'})
+
+    def test_post_search(self):
+        self.assertEqual(self.authors('/api/posts/search/?q=sunset'), {'friend', 'pest'})
+        self.block()
+        self.assertEqual(self.authors('/api/posts/search/?q=sunset'), {'friend'})
+
+    def test_user_search(self):
+        def found():
+            return {user['username'] for user in self.client.get('/api/users/search/?q=pe').data}
+        self.assertIn('pest', found())
+        self.block()
+        self.assertNotIn('pest', found())
+
+    def test_blocked_by_author(self):
+        self.block(blocker=self.pest, blocked=self.viewer)
+        self.assertEqual(self.authors('/api/posts/feed/'), {'friend'})
+
+    def test_unblock_shows_posts_again(self):
+        block_id = self.block()
+        self.assertEqual(self.client.delete(f'/api/blocks/{block_id}/').status_code, 204)
+        self.assertEqual(self.authors('/api/posts/feed/'), {'friend', 'pest'})
+
+    def test_blocks_cannot_be_edited(self):
+        block_id = self.block()
+        response = self.client.patch(f'/api/blocks/{block_id}/', {'blocked': self.friend.pk})
+        self.assertEqual(response.status_code, 405)
+        self.assertTrue(Block.objects.filter(pk=block_id, blocked=self.pest).exists())
@@ -1,5 +1,6 @@
-from rest_framework import serializers, viewsets, permissions
+from rest_framework import mixins, serializers, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django.contrib.contenttypes.models import ContentType
 from .models import Like
@@ -12,7 +13,9 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'content_object']
 
 
-class LikeViewSet(viewsets.ModelViewSet):
+class LikeViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                  viewsets.GenericViewSet):
+    """A user's likes. Likes are added with `toggle`, so LikeCounter sees every change."""
     serializer_class = LikeSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = Like.objects.none()
@@ -22,14 +25,19 @@ class LikeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def toggle(self, request):
-        content_type = ContentType.objects.get_for_id(request.data['content_type_id'])
-        obj = content_type.get_object_for_this_type(pk=request.data['object_id'])
-        like, created = Like.objects.get_or_create(
-            user=request.user,
-            content_type=content_type,
-            object_id=obj.id
-        )
-        if not created:
-            like.delete()
-            return Response({'status': 'unliked'})
-        return Response({'status': 'liked'})
+        try:
+            # get_for_id is served from the ContentType cache after the first hit.
+            content_type = ContentType.objects.get_for_id(request.data['content_type_id'])
+            object_id = int(request.data['object_id'])
+        except (KeyError, TypeError, ValueError, ContentType.DoesNotExist):
+            raise ValidationError({'detail': 'A valid content_type_id and object_id are required.'})
+
+        model = content_type.model_class()
+        if model is None or not model._default_manager.filter(pk=object_id).exists():
+            raise NotFound()
+
+        liked = Like.objects.toggle(request.user, content_type, object_id)
+        return Response({'status': 'liked' if liked else 'unliked'})
+
+    def perform_destroy(self, instance):
+        Like.objects.remove(instance)
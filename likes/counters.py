@@ -0,0 +1,79 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import LikeCounter
+
+logger = logging.getLogger(__name__)
+
+
+class LikeCounterBuffer:
+    """
+    Per-process buffer of like counter increments.
+
+    Toggles on a viral post would otherwise all update the same LikeCounter row.
+    Instead each worker accumulates deltas in memory and writes them out in one
+    transaction once `flush_size` toggles are pending, and a background thread
+    flushes whatever is pending every `flush_interval` seconds, so a process
+    that is killed outright loses at most that much.
+    """
+
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._deltas = defaultdict(int)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, content_type_id, object_id, delta):
+        with self._lock:
+            self._deltas[(content_type_id, object_id)] += delta
+            self._pending += 1
+            due = self._pending >= self.flush_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name='like-counters', daemon=True)
+                self._flusher.start()
+        if due:
+            self.try_flush()
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            self._pending = 0
+        try:
+            LikeCounter.objects.apply_deltas(deltas)
+        except Exception:
+            # Put the deltas back so the next flush retries them.
+            with self._lock:
+                for key, delta in deltas.items():
+                    self._deltas[key] += delta
+                    self._pending += 1
+            raise
+
+    def try_flush(self):
+        """Flush, logging rather than raising on failure: the likes themselves are already committed."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush like counters; will retry')
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._pending:
+                self.try_flush()
+                # This thread outlives requests, so close its connection explicitly.
+                connection.close()
+
+
+like_counters = LikeCounterBuffer(
+    flush_size=settings.LIKE_COUNTER_FLUSH_SIZE,
+    flush_interval=settings.LIKE_COUNTER_FLUSH_INTERVAL,
+)
+atexit.register(like_counters.try_flush)
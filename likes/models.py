@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 
 User = get_user_model()
 
@@ -17,17 +17,68 @@ class LikeManager(models.Manager):
     def user_likes(self, user):
         return self.filter(user=user).prefetch_related('content_object')
 
+    def toggle(self, user, content_type, object_id):
+        """
+        Flip the like of `user` on the given object and return True if it is now liked.
+
+        LikeCounter is only adjusted for a like this call really added or
+        removed, so a concurrent double tap is not counted twice. Losing the
+        insert race is handled by get_or_create rather than raising
+        IntegrityError.
+        """
+        deleted, _ = self.filter(user=user, content_type=content_type, object_id=object_id).delete()
+        if deleted:
+            _count(content_type.pk, object_id, -1)
+            return False
+        _, created = self.get_or_create(user=user, content_type=content_type, object_id=object_id)
+        if created:
+            _count(content_type.pk, object_id, 1)
+        return True
+
+    def remove(self, like):
+        """Delete `like`, keeping LikeCounter in step."""
+        deleted, _ = self.filter(pk=like.pk).delete()
+        if deleted:
+            _count(like.content_type_id, like.object_id, -1)
+        return bool(deleted)
+
     def toggle_like(self, user, content_object):
         content_type = ContentType.objects.get_for_model(content_object)
-        like, created = self.get_or_create(
-            user=user,
-            content_type=content_type,
-            object_id=content_object.id
+        return self.toggle(user, content_type, content_object.pk)
+
+
+def _count(content_type_id, object_id, delta):
+    from .counters import like_counters
+
+    # Only count changes that commit.
+    transaction.on_commit(lambda: like_counters.add(content_type_id, object_id, delta))
+
+
+class LikeCounterManager(models.Manager):
+    def counts_for(self, content_type, object_ids):
+        counts = dict(
+            self.filter(content_type=content_type, object_id__in=object_ids)
+            .values_list('object_id', 'count')
         )
-        if not created:
-            like.delete()
-            return False
-        return True
+        return {object_id: counts.get(object_id, 0) for object_id in object_ids}
+
+    def apply_deltas(self, deltas):
+        """Apply a mapping of (content_type_id, object_id) -> delta in one transaction."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(content_type_id=ct_id, object_id=object_id) for ct_id, object_id in deltas],
+                ignore_conflicts=True,
+            )
+            for (ct_id, object_id), delta in deltas.items():
+                self.filter(content_type_id=ct_id, object_id=object_id).update(
+                    count=models.Case(
+                        models.When(count__lt=-delta, then=0),
+                        default=models.F('count') + delta,
+                    )
+                )
 
 
 class Like(models.Model):
@@ -47,3 +98,17 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user} likes {self.content_object}"
+
+
+class LikeCounter(models.Model):
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    objects = LikeCounterManager()
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+
+    def __str__(self):
+        return f"{self.count} likes on {self.content_type} {self.object_id}"
@@ -0,0 +1,87 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from mediastore.models import Blob
+from mediastore.storage import media_storage
+from posts.models import PostMedia
+
+
+class Command(BaseCommand):
+    help = (
+        'Move media saved before content-addressed storage into the sharded '
+        'digest layout, deduplicating identical files. Safe to re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.adopted = {}
+        self.missing = 0
+        for model, field in ((PostMedia, 'file'), (get_user_model(), 'profile_picture')):
+            moved = self.rehash_field(model, field)
+            self.stdout.write(f'{model.__name__}.{field}: rewrote {moved} rows')
+        self.stdout.write(f'PostMedia.variants: rewrote {self.rehash_variants()} rows')
+        blobs = len(set(self.adopted.values()))
+        self.stdout.write(
+            f'{len(self.adopted)} files moved into {blobs} blobs '
+            f'({len(self.adopted) - blobs} duplicates removed), {self.missing} missing'
+        )
+
+    def rehash(self, name):
+        if not name or media_storage.is_content_addressed(name):
+            return None
+        if name in self.adopted:
+            # Another row pointed at the same legacy file: it needs its own reference.
+            new = self.adopted[name]
+            Blob.objects.acquire(new, media_storage.size(new))
+            return new
+        if not os.path.exists(media_storage.path(name)):
+            self.missing += 1
+            self.stderr.write(f'Missing file: {name}')
+            return None
+        new = self.adopted[name] = media_storage.adopt(name)
+        return new
+
+    def chunks(self, queryset):
+        last = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last).order_by('pk')[:self.chunk_size])
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def rehash_field(self, model, field):
+        rows = (
+            model.objects.exclude(**{field: ''})
+            .exclude(**{f'{field}__startswith': media_storage.prefix + '/'})
+            .values_list('pk', field)
+        )
+        moved = 0
+        for chunk in self.chunks(rows):
+            for pk, name in chunk:
+                new = self.rehash(name)
+                if new:
+                    # Each row is updated right after its file moves, so an interrupted run can resume.
+                    model.objects.filter(pk=pk).update(**{field: new})
+                    moved += 1
+        return moved
+
+    def rehash_variants(self):
+        moved = 0
+        for chunk in self.chunks(PostMedia.objects.exclude(variants={}).values_list('pk', 'variants')):
+            for pk, variants in chunk:
+                changed = False
+                for variant in variants.values():
+                    new = self.rehash(variant['name'])
+                    if new:
+                        variant['name'] = new
+                        changed = True
+                if changed:
+                    PostMedia.objects.filter(pk=pk).update(variants=variants)
+                    moved += 1
+        return moved
@@ -0,0 +1,40 @@
+from django.db import models, transaction
+
+
+class BlobManager(models.Manager):
+    def acquire(self, name, size):
+        """Record one more reference to the stored file `name`."""
+        with transaction.atomic():
+            while True:
+                self.bulk_create([self.model(name=name, size=size, refcount=0)], ignore_conflicts=True)
+                # Zero rows means a concurrent release deleted the row after our insert was skipped.
+                if self.filter(name=name).update(refcount=models.F('refcount') + 1):
+                    return
+
+    def release(self, name):
+        """
+        Drop one reference to `name` and return True when it was the last one,
+        meaning the file can be deleted. Returns None for files not tracked here.
+        """
+        with transaction.atomic():
+            blob = self.select_for_update().filter(name=name).first()
+            if blob is None:
+                return None
+            if blob.refcount > 1:
+                self.filter(name=name).update(refcount=models.F('refcount') - 1)
+                return False
+            blob.delete()
+            return True
+
+
+class Blob(models.Model):
+    """A file in content-addressed storage and the number of references to it."""
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
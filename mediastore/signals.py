@@ -0,0 +1,70 @@
+from functools import partial
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .storage import ContentAddressedStorage
+
+
+def content_addressed_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def _stored_name(value):
+    """
+    The storage name of a field value, or '' unless it is already in storage:
+    a model built with an upload (e.g. `PostMedia(file=upload)`) holds the
+    client's filename until it is saved, and that must never be deleted.
+    """
+    if isinstance(value, str):
+        return value
+    if value is None or not getattr(value, '_committed', False):
+        return ''
+    return value.name or ''
+
+
+def _release(field, name):
+    if name:
+        transaction.on_commit(partial(field.storage.delete, name))
+
+
+def remember_files(sender, instance, **kwargs):
+    instance._stored_files = {
+        field.attname: _stored_name(instance.__dict__.get(field.attname))
+        for field in sender._content_addressed_fields
+    }
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_files', {})
+    for field in sender._content_addressed_fields:
+        current = _stored_name(getattr(instance, field.attname))
+        previous = stored.get(field.attname)
+        if previous and previous != current:
+            _release(field, previous)
+        stored[field.attname] = current
+    instance._stored_files = stored
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in sender._content_addressed_fields:
+        _release(field, _stored_name(getattr(instance, field.attname)))
+
+
+def connect_file_fields():
+    """
+    Keep blob reference counts in step with model rows: a file is released when
+    its row is deleted or the field is pointed at a different file.
+    """
+    for model in apps.get_models():
+        fields = content_addressed_fields(model)
+        if not fields:
+            continue
+        model._content_addressed_fields = fields
+        post_init.connect(remember_files, sender=model, weak=False)
+        post_save.connect(release_replaced_files, sender=model, weak=False)
+        post_delete.connect(release_deleted_files, sender=model, weak=False)
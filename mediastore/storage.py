@@ -0,0 +1,154 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+CHUNK_SIZE = 1024 * 1024
+
+_stored = threading.local()
+
+
+def file_digest(path):
+    with open(path, 'rb') as fh:
+        return hashlib.file_digest(fh, 'sha256').hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names files after the SHA-256 of their content.
+
+    Files live at ``<prefix>/ab/cd/abcd....ext``, so no directory grows without
+    bound. Saving bytes that are already stored only adds a reference, and
+    `delete` removes the file once its last reference is gone. Files saved
+    before this storage was introduced are not tracked and are deleted
+    directly.
+    """
+
+    def __init__(self, prefix=None, **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix if prefix is not None else settings.MEDIA_STORE_PREFIX
+
+    def digest_name(self, digest, original_name=''):
+        extension = os.path.splitext(original_name)[1].lower()
+        return posixpath.join(self.prefix, digest[:2], digest[2:4], digest + extension)
+
+    def is_content_addressed(self, name):
+        return name.startswith(self.prefix + '/')
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, so it never needs a suffix.
+        return name
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if hasattr(content, 'temporary_file_path'):
+            source = content.temporary_file_path()
+            return self._store(source, digest or file_digest(source), name)
+
+        # Hash while spooling to a temporary file next to the destination, so the
+        # content is read once and the final rename is atomic.
+        os.makedirs(self.path(self.prefix), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path(self.prefix), prefix='.upload-')
+        try:
+            hasher = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    hasher.update(chunk)
+                    out.write(chunk)
+            return self._store(tmp, hasher.hexdigest(), name)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _store(self, source, digest, original_name):
+        """Move `source` into place unless the same content is already stored, and take a reference."""
+        from .models import Blob
+
+        name = self.digest_name(digest, original_name)
+        full_path = self.path(name)
+        with transaction.atomic():
+            # Take the reference first: it locks the Blob row, so a concurrent
+            # `delete` of the last reference can't remove the file between the
+            # existence check and the commit.
+            Blob.objects.acquire(name, os.path.getsize(source))
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                # Concurrent writers of the same content produce identical files, so overwriting is safe.
+                file_move_safe(source, full_path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        if hasattr(_stored, 'names'):
+            _stored.names.append((self, name))
+        return name
+
+    def adopt(self, name):
+        """
+        Move an existing, untracked file into content-addressed layout and
+        return its new name. The file is renamed rather than copied.
+        """
+        source = self.path(name)
+        stored = self._store(source, file_digest(source), name)
+        if os.path.exists(source) and self.path(stored) != source:
+            # The content was already stored under its digest; this copy is redundant.
+            os.remove(source)
+        return stored
+
+    def delete(self, name):
+        from .models import Blob
+
+        if not name:
+            return
+        with transaction.atomic():
+            # The file goes while `release` still holds the Blob row lock; see _store.
+            if Blob.objects.release(name) is False:
+                return
+            super().delete(name)
+
+    def discard_unreferenced(self, name):
+        """Remove a stored file that no Blob row references, e.g. after its save rolled back."""
+        from .models import Blob
+
+        with transaction.atomic():
+            if not Blob.objects.select_for_update().filter(name=name).exists():
+                super().delete(name)
+
+
+@contextmanager
+def atomic_files():
+    """
+    A transaction for saving rows with content-addressed files. If it rolls
+    back, the blob references taken inside it roll back with it and files
+    stored only for it are removed.
+    """
+    outermost = not hasattr(_stored, 'names')
+    if outermost:
+        _stored.names = []
+    start = len(_stored.names)
+    try:
+        with transaction.atomic():
+            yield
+    except BaseException:
+        for storage, name in _stored.names[start:]:
+            storage.discard_unreferenced(name)
+        raise
+    finally:
+        del _stored.names[start:]
+        if outermost:
+            del _stored.names
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Storage callable for FileFields, so migrations don't serialise the instance."""
+    return media_storage
@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+
+from accounts.models import User
+from posts.models import Post, PostMedia
+from .models import Blob
+from .storage import atomic_files, media_storage
+from .views import serve_media
+
+
+class ContentAddressedFileTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.media_root = media_root.name
+        user = User.objects.create_user(email='media@example.com', username='media', password='x')
+        self.post = Post.objects.create(user=user, caption='media')
+
+    def upload(self, content=b'image bytes'):
+        return SimpleUploadedFile('IMG.jpg', content, content_type='image/jpeg')
+
+    def test_saving_new_media_keeps_file_named_like_the_upload(self):
+        unrelated = os.path.join(self.media_root, 'IMG.jpg')
+        with open(unrelated, 'wb') as fh:
+            fh.write(b'someone else')
+        with self.captureOnCommitCallbacks(execute=True):
+            media = PostMedia.objects.create(post=self.post, media_type='image', file=self.upload())
+        self.assertTrue(media.file.name.startswith('blobs/'))
+        self.assertTrue(os.path.exists(unrelated))
+        self.assertTrue(media_storage.exists(media.file.name))
+
+    def test_replacing_file_releases_previous_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            media = PostMedia.objects.create(post=self.post, media_type='image', file=self.upload(b'one'))
+        old = media.file.name
+        media = PostMedia.objects.get(pk=media.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            media.file = self.upload(b'two')
+            media.save()
+        self.assertFalse(media_storage.exists(old))
+        self.assertFalse(Blob.objects.filter(name=old).exists())
+        self.assertEqual(Blob.objects.get(name=media.file.name).refcount, 1)
+
+    def test_failed_save_rolls_back_reference_and_file(self):
+        with self.assertRaises(RuntimeError), atomic_files():
+            media = PostMedia.objects.create(post=self.post, media_type='image', file=self.upload())
+            raise RuntimeError
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(media_storage.exists(media.file.name))
+
+
+class ServeMediaTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, MEDIA_SENDFILE_HEADER=''))
+        user = User.objects.create_user(email='media@example.com', username='media', password='x')
+        post = Post.objects.create(user=user, caption='media')
+        with self.captureOnCommitCallbacks(execute=True):
+            media = PostMedia.objects.create(
+                post=post, media_type='image', file=SimpleUploadedFile('IMG.jpg', b'0123456789'),
+            )
+        self.path = media.file.name
+
+    def get(self, **headers):
+        return serve_media(RequestFactory().get('/', headers=headers), self.path)
+
+    def test_full_and_partial_responses_are_immutable(self):
+        full = self.get()
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(b''.join(full.streaming_content), b'0123456789')
+        partial = self.get(Range='bytes=2-4')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), b'234')
+        for response in (full, partial):
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertFalse(response['ETag'].startswith('W/'))
+
+    def test_unsatisfiable_range_is_not_cached(self):
+        response = self.get(Range='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        self.assertNotIn('Cache-Control', response)
+        self.assertNotIn('ETag', response)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
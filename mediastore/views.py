@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import media_storage
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _etag(name, stat):
+    digest = posixpath.splitext(posixpath.basename(name))[0]
+    if media_storage.is_content_addressed(name) and DIGEST_RE.match(digest):
+        return f'"{digest}"'
+    # Files saved before content-addressed storage have no digest to hand.
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _byte_range(header, size):
+    """(start, end) inclusive for a single satisfiable range, 'invalid', or None to send everything."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed or multi-range requests get the whole file, which RFC 9110 allows.
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def _if_range_passes(if_range, etag, last_modified):
+    # A changed file must be sent whole rather than spliced into a stale copy.
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return if_range == last_modified
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with strong ETags, 304s, single byte ranges
+    and long-lived caching for content-addressed files. When
+    MEDIA_SENDFILE_HEADER is set, only headers are produced and the front
+    proxy transfers the bytes.
+    """
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = _etag(path, stat)
+    cache_headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        # Content-addressed names change whenever the content does.
+        'Cache-Control': (
+            'public, max-age=31536000, immutable' if media_storage.is_content_addressed(path)
+            else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+        ),
+    }
+    probe = HttpResponse(headers=cache_headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime), response=probe)
+    if conditional is not probe:
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    sendfile = settings.MEDIA_SENDFILE_HEADER
+    if sendfile:
+        response = HttpResponse(content_type=content_type)
+        if sendfile == 'X-Accel-Redirect':
+            response[sendfile] = quote(settings.MEDIA_SENDFILE_PREFIX + path)
+        else:
+            response[sendfile] = full_path
+    else:
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if range_header and _if_range_passes(request.headers.get('If-Range'), etag, cache_headers['Last-Modified']):
+            byte_range = _byte_range(range_header, stat.st_size)
+        if byte_range == 'invalid':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if response.status_code in (200, 206):
+        for header, value in cache_headers.items():
+            response[header] = value
+    else:
+        # Caches must not hold on to an unsatisfiable range, let alone for a year.
+        response['Accept-Ranges'] = 'bytes'
+    return response
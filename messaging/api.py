@@ -1,7 +1,11 @@
+from django.db.models import Count, Max
 from rest_framework import serializers, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from blocks.cache import exclude_blocked
+from pixessa.conditional import conditional, validators
+from pixessa.serializers import CompiledListMixin, CompiledListSerializer, SparseFieldsMixin
 from .models import Conversation, Message
 
 
@@ -26,28 +30,56 @@ class ConversationSerializer(serializers.ModelSerializer):
         return MessageSerializer(last_message).data if last_message else None
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+def conversation_list_validator(view):
+    conversations = view.get_queryset().aggregate(count=Count('id'), latest=Max('updated_at'))
+    return validators(timestamps=[conversations['latest']], extra=[conversations['count']])
+
+
+def message_list_validator(view):
+    # Conversation.updated_at is touched whenever one of its messages changes.
+    messages = view.get_queryset().aggregate(count=Count('id'), latest=Max('conversation__updated_at'))
+    return validators([('blocks', view.request.user.pk)], [messages['latest']], extra=[messages['count']])
+
+
+class ConversationViewSet(SparseFieldsMixin, CompiledListMixin, viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = Conversation.objects.none()
 
     def get_queryset(self):
-        return self.request.user.conversations.all()
+        conversations = self.request.user.conversations.all()
+        if self.requested('participants'):
+            conversations = conversations.prefetch_related('participants')
+        return conversations
+
+    @conditional(conversation_list_validator)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
         conversation = self.get_object()
-        messages = conversation.messages.all().order_by('-timestamp')
-        serializer = MessageSerializer(messages, many=True)
+        messages = exclude_blocked(conversation.messages.all(), request.user, field='sender')
+        if self.requested('sender'):
+            messages = messages.select_related('sender')
+        messages = messages.order_by('-timestamp')
+        serializer = self.sparse(CompiledListSerializer(MessageSerializer, messages, self.get_serializer_context()))
         return Response(serializer.data)
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(SparseFieldsMixin, CompiledListMixin, viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Message.objects.filter(conversation__participants=self.request.user)
+        messages = Message.objects.filter(conversation__participants=self.request.user)
+        if self.requested('sender'):
+            messages = messages.select_related('sender')
+        return exclude_blocked(messages, self.request.user, field='sender')
+
+    @conditional(message_list_validator)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         conversation = Conversation.objects.get(pk=self.kwargs['conversation_pk'])
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -23,7 +24,9 @@ class MessageManager(models.Manager):
         return self.filter(conversation__participants=user, read=False).exclude(sender=user)
 
     def mark_as_read(self, message_ids):
-        return self.filter(id__in=message_ids).update(read=True)
+        updated = self.filter(id__in=message_ids).update(read=True)
+        Conversation.objects.filter(messages__id__in=message_ids).update(updated_at=timezone.now())
+        return updated
 
     def recent_messages(self, conversation, limit=50):
         return self.filter(conversation=conversation).order_by('-timestamp')[:limit]
@@ -48,5 +51,11 @@ class Message(models.Model):
 
     objects = MessageManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp'], name='message_conv_timestamp_idx'),
+            models.Index(fields=['conversation'], condition=models.Q(read=False), name='message_unread_conv_idx'),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} in {self.conversation}"
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def touch_conversation(sender, instance, **kwargs):
+    # Keeps Conversation.updated_at usable as a validator for the message list.
+    Conversation.objects.filter(pk=instance.conversation_id).update(updated_at=timezone.now())
@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+
+from pixessa.serializers import CompiledListMixin
 from .models import Notification
 
 
@@ -16,15 +19,41 @@ class NotificationSerializer(serializers.ModelSerializer):
         return str(obj.content_object)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(CompiledListMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = Notification.objects.none()
 
     def get_queryset(self):
-        return self.request.user.notifications.all().order_by('-created_at')
+        return self.request.user.notifications.prefetch_related('content_object').order_by('-created_at')
+
+    def perform_update(self, serializer):
+        notification = serializer.instance
+        changes = serializer.validated_data
+        is_read = changes.pop('is_read', None)
+        with transaction.atomic():
+            # Write only the fields sent, never a stale is_read; the counter
+            # moves only if this request is the one that flipped the row.
+            if changes:
+                for field, value in changes.items():
+                    setattr(notification, field, value)
+                notification.save(update_fields=list(changes))
+            if is_read is not None:
+                Notification.objects.mark_as_read(notification, is_read)
+
+    def perform_destroy(self, instance):
+        Notification.objects.delete_notification(instance)
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return Response({'unread_count': Notification.objects.unread_count(request.user)})
+
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        Notification.objects.mark_as_read(self.get_object())
+        return Response({'status': 'notification marked as read'})
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
-        request.user.notifications.filter(is_read=False).update(is_read=True)
-        return Response({'status': 'all notifications marked as read'})
\ No newline at end of file
+        Notification.objects.mark_all_as_read(request.user)
+        return Response({'status': 'all notifications marked as read'})
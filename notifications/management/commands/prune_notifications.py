@@ -0,0 +1,52 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from notifications.models import Notification, NotificationCounter
+
+
+class Command(BaseCommand):
+    help = 'Delete (and optionally archive) read notifications older than the retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+            help='Retention window in days (default: NOTIFICATION_RETENTION_DAYS).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.NOTIFICATION_PRUNE_BATCH_SIZE,
+            help='Number of rows deleted per statement.'
+        )
+        parser.add_argument(
+            '--archive', metavar='PATH',
+            help='Append pruned notifications to this file as JSON lines before deleting them.'
+        )
+        parser.add_argument(
+            '--rebuild-counters', action='store_true',
+            help='Recompute every unread counter from the notification rows afterwards.'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archive = open(options['archive'], 'a') if options['archive'] else None
+        total = 0
+        try:
+            for batch in Notification.objects.prune_read(cutoff, batch_size=options['batch_size']):
+                if archive:
+                    archive.writelines(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in batch)
+                    archive.flush()
+                total += len(batch)
+        finally:
+            if archive:
+                archive.close()
+
+        if options['rebuild_counters']:
+            NotificationCounter.objects.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {total} read notifications older than {options["days"]} days.'
+        ))
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 
 User = get_user_model()
 
@@ -10,8 +10,29 @@ class NotificationManager(models.Manager):
     def unread(self, user):
         return self.filter(user=user, is_read=False)
 
+    def unread_count(self, user):
+        return NotificationCounter.objects.unread_count(user)
+
     def mark_all_as_read(self, user):
-        return self.filter(user=user, is_read=False).update(is_read=True)
+        with transaction.atomic():
+            updated = self.filter(user=user, is_read=False).update(is_read=True)
+            NotificationCounter.objects.filter(user=user).update(unread=0)
+        return updated
+
+    def mark_as_read(self, notification, is_read=True):
+        """Flip `is_read` if it isn't already and return whether this call changed it."""
+        with transaction.atomic():
+            updated = self.filter(pk=notification.pk, is_read=not is_read).update(is_read=is_read)
+            if updated:
+                NotificationCounter.objects.adjust(notification.user_id, -1 if is_read else 1)
+        notification.is_read = is_read
+        return bool(updated)
+
+    def delete_notification(self, notification):
+        with transaction.atomic():
+            deleted, _ = self.filter(pk=notification.pk).delete()
+            if deleted and not notification.is_read:
+                NotificationCounter.objects.adjust(notification.user_id, -1)
 
     def for_content_object(self, content_object):
         content_type = ContentType.objects.get_for_model(content_object)
@@ -22,12 +43,65 @@ class NotificationManager(models.Manager):
 
     def create_notification(self, user, notification_type, content_object):
         content_type = ContentType.objects.get_for_model(content_object)
-        return self.create(
-            user=user,
-            notification_type=notification_type,
-            content_type=content_type,
-            object_id=content_object.pk
+        with transaction.atomic():
+            notification = self.create(
+                user=user,
+                notification_type=notification_type,
+                content_type=content_type,
+                object_id=content_object.pk
+            )
+            NotificationCounter.objects.adjust(user.pk, 1)
+        return notification
+
+    def prune_read(self, older_than, batch_size=500):
+        """
+        Delete read notifications created before `older_than` in batches of
+        `batch_size` rows, yielding each deleted batch so callers can archive it.
+        """
+        stale = self.filter(is_read=True, created_at__lt=older_than).order_by('id')
+        while True:
+            batch = list(stale.values(
+                'id', 'user_id', 'notification_type', 'content_type_id', 'object_id', 'created_at'
+            )[:batch_size])
+            if not batch:
+                return
+            self.filter(id__in=[row['id'] for row in batch]).delete()
+            yield batch
+
+
+class NotificationCounterManager(models.Manager):
+    def unread_count(self, user):
+        return self.filter(user=user).values_list('unread', flat=True).first() or 0
+
+    def adjust(self, user_id, delta):
+        updated = self.filter(user_id=user_id).update(
+            unread=models.Case(
+                models.When(unread__lt=-delta, then=0),
+                default=models.F('unread') + delta,
+            )
         )
+        if not updated and delta > 0:
+            # Create the row first and then increment it, so concurrent first
+            # notifications each land their increment.
+            self.bulk_create([self.model(user_id=user_id)], ignore_conflicts=True)
+            self.filter(user_id=user_id).update(unread=models.F('unread') + delta)
+
+    def rebuild(self, user=None):
+        """Recompute counters from the notification rows themselves."""
+        unread = Notification.objects.filter(is_read=False)
+        if user is not None:
+            unread = unread.filter(user=user)
+        counts = dict(unread.values_list('user').annotate(n=models.Count('id')).order_by())
+        with transaction.atomic():
+            stale = self.all() if user is None else self.filter(user=user)
+            stale.exclude(user__in=counts.keys()).update(unread=0)
+            self.bulk_create(
+                [self.model(user_id=user_id, unread=n) for user_id, n in counts.items()],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['unread'],
+                batch_size=500,
+            )
 
 
 class Notification(models.Model):
@@ -49,5 +123,28 @@ class Notification(models.Model):
 
     objects = NotificationManager()
 
+    class Meta:
+        indexes = [
+            # Ties with notif_user_created_idx for unread lookups; SQLite picks this one
+            # because migration 0005 creates it later (see `manage.py audit_query_plans`).
+            models.Index(
+                fields=['user', 'created_at'], condition=models.Q(is_read=False), name='notif_unread_user_created_idx',
+            ),
+            models.Index(fields=['user', 'created_at'], name='notif_user_created_idx'),
+            models.Index(fields=['content_type', 'object_id'], name='notif_content_object_idx'),
+        ]
+
     def __str__(self):
         return f"{self.notification_type} notification for {self.user}"
+
+
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+
+    objects = NotificationCounterManager()
+
+    def __str__(self):
+        return f"{self.unread} unread notifications for {self.user}"
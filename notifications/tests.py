@@ -1,3 +1,62 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from posts.models import Post
+from .api import NotificationSerializer, NotificationViewSet
+from .models import Notification, NotificationCounter
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@example.com', username='reader', password='x')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def notify(self):
+        return Notification.objects.create_notification(self.user, 'like', self.post)
+
+    def unread(self):
+        return self.client.get('/api/notifications/unread_count/').data['unread_count']
+
+    def test_create_read_delete(self):
+        first, second = self.notify(), self.notify()
+        self.assertEqual(self.unread(), 2)
+        self.client.post(f'/api/notifications/{first.pk}/mark_read/')
+        self.client.post(f'/api/notifications/{first.pk}/mark_read/')
+        self.assertEqual(self.unread(), 1)
+        self.client.delete(f'/api/notifications/{first.pk}/')
+        self.assertEqual(self.unread(), 1)
+        self.client.delete(f'/api/notifications/{second.pk}/')
+        self.assertEqual(self.unread(), 0)
+
+    def test_update_counts_only_real_flips(self):
+        notification = self.notify()
+        url = f'/api/notifications/{notification.pk}/'
+        for is_read, expected in ((True, 0), (True, 0), (False, 1), (False, 1)):
+            response = self.client.patch(url, {'is_read': is_read})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['is_read'], is_read)
+            self.assertEqual(self.unread(), expected)
+
+    def test_update_does_not_write_back_stale_read_state(self):
+        notification = self.notify()
+        serializer = NotificationSerializer(notification, data={'notification_type': 'comment'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        # Another request marks it read between loading and saving.
+        Notification.objects.mark_as_read(Notification.objects.get(pk=notification.pk))
+        NotificationViewSet().perform_update(serializer)
+        notification.refresh_from_db()
+        self.assertEqual((notification.notification_type, notification.is_read), ('comment', True))
+        self.assertEqual(self.unread(), 0)
+
+    def test_mark_all_read_and_rebuild(self):
+        self.notify()
+        self.notify()
+        self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self.unread(), 0)
+        self.notify()
+        NotificationCounter.objects.filter(user=self.user).update(unread=7)
+        NotificationCounter.objects.rebuild(self.user)
+        self.assertEqual(self.unread(), 1)
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pixessa.settings')
 
 application = get_asgi_application()
+
+# Build the follow graph and user search index before the first search needs them.
+from accounts.graph import warm_graph  # noqa: E402
+from accounts.search import warm_index  # noqa: E402
+
+warm_graph()
+warm_index()
@@ -0,0 +1,25 @@
+"""Helpers shared by the ``bench_*`` management commands."""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def scratch_data(using=None):
+    """Run the block in a transaction that is always rolled back, so benchmarks can seed freely."""
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
+
+
+def measure(fn, number=100, repeat=5):
+    """Return the best and median time of one call to `fn`, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) * 1000 / number)
+    return min(timings), statistics.median(timings)
@@ -0,0 +1,141 @@
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from rest_framework.response import Response
+
+from .models import EntityVersion, ResponseCacheCount
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = []
+
+
+def versions(dependencies):
+    """
+    Current version of each (scope, key) pair, in one query.
+
+    Versions are change times in nanoseconds, kept in the database so that
+    every worker sees the same ones and bumps are atomic. Entities that have
+    never changed are at version 0.
+    """
+    dependencies = [(scope, str(key)) for scope, key in dependencies]
+    found = EntityVersion.objects.current(dependencies)
+    return [found.get(dependency, 0) for dependency in dependencies]
+
+
+def version(scope, key):
+    return versions([(scope, key)])[0]
+
+
+def bump(scope, *keys):
+    """
+    Invalidate everything stamped with these versions. The version rows are
+    updated in the current transaction, so readers see the new versions
+    exactly when they can see the change.
+    """
+    # Versions are change times in nanoseconds, so they also serve as Last-Modified.
+    EntityVersion.objects.bump(scope, sorted({str(key) for key in keys}), time.time_ns())
+
+
+_counts = defaultdict(int)
+_counts_lock = threading.Lock()
+_flusher = None
+
+
+def _count(endpoint, outcome):
+    global _flusher
+    with _counts_lock:
+        _counts[endpoint, outcome] += 1
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_counts_periodically, name='response-cache-stats', daemon=True)
+            _flusher.start()
+
+
+def flush_counts():
+    """Add this process's hit and miss counts to ResponseCacheCount."""
+    global _counts
+    with _counts_lock:
+        counts, _counts = _counts, defaultdict(int)
+    if not counts:
+        return
+    try:
+        with transaction.atomic():
+            endpoints = sorted({endpoint for endpoint, _ in counts})
+            ResponseCacheCount.objects.bulk_create(
+                [ResponseCacheCount(endpoint=endpoint) for endpoint in endpoints], ignore_conflicts=True,
+            )
+            for endpoint in endpoints:
+                ResponseCacheCount.objects.filter(endpoint=endpoint).update(
+                    hits=models.F('hits') + counts[endpoint, 'hit'],
+                    misses=models.F('misses') + counts[endpoint, 'miss'],
+                )
+    except Exception:
+        logger.exception('Could not record response cache counts; will retry')
+        with _counts_lock:
+            for key, n in counts.items():
+                _counts[key] += n
+
+
+def _flush_counts_periodically():
+    # A thread of its own, so the writes never count as the request's (see pixessa.db_router).
+    while True:
+        time.sleep(settings.RESPONSE_CACHE_STATS_INTERVAL)
+        flush_counts()
+        connection.close()
+
+
+atexit.register(flush_counts)
+
+
+def hit_rates():
+    """{endpoint: (hits, misses)} for every endpoint using `cached_response`."""
+    counts = {row.endpoint: (row.hits, row.misses) for row in ResponseCacheCount.objects.all()}
+    return {endpoint: counts.get(endpoint, (0, 0)) for endpoint in ENDPOINTS}
+
+
+def reset_hit_rates():
+    ResponseCacheCount.objects.all().delete()
+
+
+def cached_response(endpoint, dependencies):
+    """
+    Cache the data of successful GET responses of a viewset method per viewer
+    and full path. `dependencies(view)` lists the (scope, key) versions the
+    response is built from; an entry is served only while all of them are
+    unchanged, so writes invalidate by calling `bump` rather than by finding
+    keys. Versions are read before the response is built, so a write
+    committing in between leaves the entry already stale rather than stamped
+    as current. Entries also expire after RESPONSE_CACHE_TIMEOUT.
+    """
+    ENDPOINTS.append(endpoint)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED or request.method not in ('GET', 'HEAD'):
+                return method(view, request, *args, **kwargs)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'response:{endpoint}:{request.user.pk or 0}:{path}'
+            entry = cache.get(key)
+            if entry is not None:
+                data, stamps = entry
+                if versions([dependency for dependency, _ in stamps]) == [stamp for _, stamp in stamps]:
+                    _count(endpoint, 'hit')
+                    return Response(data)
+            _count(endpoint, 'miss')
+            deps = list(dependencies(view))
+            stamps = list(zip(deps, versions(deps)))
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.data, stamps), settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
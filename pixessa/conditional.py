@@ -0,0 +1,61 @@
+import hashlib
+from functools import wraps
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache import versions
+
+
+def validators(dependencies=(), timestamps=(), extra=(), stamps=()):
+    """
+    Build the (parts, last_modified) pair a `conditional` validator returns
+    from version dependencies, model timestamps, versions the caller already
+    read (`stamps`) and any other values that identify the representation,
+    such as row counts.
+    """
+    stamps = versions(dependencies) + [stamp for stamp in stamps if stamp]
+    modified = [ts.timestamp() for ts in timestamps if ts is not None] + [stamp / 1e9 for stamp in stamps]
+    return [*extra, *stamps, *modified], max(modified, default=None)
+
+
+def conditional(validator):
+    """
+    ETag/Last-Modified support for a viewset method. `validator(view)`
+    cheaply describes the current representation without serializing it and
+    returns (parts, last_modified), or None to skip the check (e.g. when the
+    object doesn't exist and the view should produce the 404). Matching
+    If-None-Match / If-Modified-Since requests get a 304 before the method runs.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(view, request, *args, **kwargs)
+            validated = validator(view)
+            if validated is None:
+                return method(view, request, *args, **kwargs)
+            parts, last_modified = validated
+            # Responses vary by viewer, query string (e.g. ?fields=) and renderer.
+            key = repr((request.user.pk, request.get_full_path(), request.accepted_media_type, parts))
+            etag = f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+            headers = {'ETag': etag}
+            if last_modified is not None:
+                last_modified = int(last_modified)
+                headers['Last-Modified'] = http_date(last_modified)
+            probe = HttpResponse(headers=headers)
+            patch_cache_control(probe, private=True, no_cache=True)
+            conditional_response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified, response=probe,
+            )
+            if conditional_response is not probe:
+                return conditional_response
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+                    if header in probe:
+                        response[header] = probe[header]
+            return response
+        return wrapper
+    return decorator
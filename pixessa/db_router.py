@@ -0,0 +1,133 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.primary = request.method not in SAFE_METHODS
+        self.wrote = False
+        self.checked_user = None
+
+
+_state = ContextVar('db_router_state', default=None)
+_forced = ContextVar('db_router_forced', default=None)
+
+
+def _pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def _resolved_user_id(request):
+    """The viewer's id, 0 if anonymous, or None while request.user hasn't been loaded."""
+    # Never force a lazy request.user from inside the router: loading it queries the database.
+    user = request.__dict__.get('user')
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return None
+    return user.pk if user.is_authenticated else 0
+
+
+def _authenticates(model):
+    return model._meta.label in (settings.AUTH_USER_MODEL, 'sessions.Session')
+
+
+def replica_alias():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def on_primary(queryset):
+    """Read `queryset` from the primary whatever the request."""
+    return queryset.using(DEFAULT_DB_ALIAS)
+
+
+def on_replica(queryset):
+    """
+    Read `queryset` from a replica even while the viewer is pinned to the
+    primary, for reads that tolerate replication lag.
+    """
+    if not settings.DATABASE_REPLICAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return queryset
+    return queryset.using(replica_alias())
+
+
+@contextmanager
+def use_primary():
+    token = _forced.set(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads made while serving safe-method requests to DATABASE_REPLICAS
+    and everything else to the primary. Reads stay on the primary in a
+    request that has written, inside transactions, outside requests
+    (commands, workers) and for REPLICA_PIN_SECONDS after the user last
+    wrote, so users always see their own writes. Until the pin has been
+    checked, the user and session lookups that authenticate the request
+    also go to the primary, so a lagging replica can't reject a fresh
+    login or load a pinned user stale.
+    """
+
+    def db_for_read(self, model, **hints):
+        forced = _forced.get()
+        if forced:
+            return forced
+        state = _state.get()
+        if state is None or state.primary or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.checked_user is None:
+            user_id = _resolved_user_id(state.request)
+            if user_id is None:
+                if _authenticates(model):
+                    return DEFAULT_DB_ALIAS
+            else:
+                state.checked_user = user_id
+                if user_id and cache.get(_pin_key(user_id)):
+                    state.primary = True
+                    return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = state.primary = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """Track the current request for ReplicaRouter and pin users who wrote to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RequestState(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            user_id = _resolved_user_id(request)
+            if user_id:
+                cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
@@ -0,0 +1,47 @@
+from django.db import models
+from django.db.models.functions import Greatest
+
+
+class EntityVersionManager(models.Manager):
+    def current(self, dependencies):
+        """{(scope, key): version} for the given pairs that have ever changed, in one query."""
+        if not dependencies:
+            return {}
+        match = models.Q()
+        for scope, key in dependencies:
+            match |= models.Q(scope=scope, key=key)
+        rows = self.filter(match).values_list('scope', 'key', 'version')
+        return {(scope, key): version for scope, key, version in rows}
+
+    def bump(self, scope, keys, now_ns):
+        """Atomically move each version past both its current value and `now_ns`."""
+        rows = self.filter(scope=scope, key__in=keys)
+        newer = Greatest(models.F('version') + 1, models.Value(now_ns))
+        if rows.update(version=newer) < len(keys):
+            self.bulk_create([self.model(scope=scope, key=key) for key in keys], ignore_conflicts=True)
+            rows.update(version=newer)
+
+
+class EntityVersion(models.Model):
+    """When a cached entity last changed, in nanoseconds; see pixessa.cache."""
+    scope = models.CharField(max_length=32)
+    key = models.CharField(max_length=64)
+    version = models.BigIntegerField(default=0)
+
+    objects = EntityVersionManager()
+
+    class Meta:
+        unique_together = ('scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} @ {self.version}"
+
+
+class ResponseCacheCount(models.Model):
+    """Hits and misses of one `cached_response` endpoint, summed over every worker."""
+    endpoint = models.CharField(max_length=64, unique=True)
+    hits = models.PositiveBigIntegerField(default=0)
+    misses = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.endpoint}: {self.hits} hits, {self.misses} misses"
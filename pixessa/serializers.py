@@ -0,0 +1,211 @@
+from operator import attrgetter
+import datetime
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Manager
+from django.utils import timezone
+from rest_framework import ISO_8601, fields as drf_fields, permissions, relations, serializers
+from rest_framework.settings import api_settings
+
+
+def _datetime(field):
+    if (
+        getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601 or hasattr(field, 'timezone')
+        or timezone.get_current_timezone_name() != 'UTC'
+    ):
+        return field.to_representation
+
+    def represent(value):
+        # Aware UTC values only need formatting; anything else goes through DRF's timezone handling.
+        if value.tzinfo is datetime.timezone.utc:
+            return value.isoformat()[:-6] + 'Z'
+        return field.to_representation(value)
+    return represent
+
+
+def _file(field, request):
+    if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+        return field.to_representation
+
+    def represent(value):
+        if not value:
+            return None
+        try:
+            url = value.url
+        except AttributeError:
+            return None
+        return request.build_absolute_uri(url) if request is not None else url
+    return represent
+
+
+def _identity(value):
+    return value
+
+
+def _representer(field, request):
+    """A function from an attribute value to what `field.to_representation` would return for it."""
+    kind = type(field)
+    if kind in (drf_fields.IntegerField, drf_fields.BooleanField, drf_fields.FloatField):
+        # Model values already have the right type.
+        return _identity
+    if kind is drf_fields.JSONField and not field.binary:
+        return _identity
+    if kind in (drf_fields.CharField, drf_fields.EmailField, relations.StringRelatedField):
+        return str
+    if isinstance(field, drf_fields.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, drf_fields.FileField):
+        return _file(field, request)
+    return field.to_representation
+
+
+def _getter(field):
+    if field.source == '*':
+        return _identity
+    if type(field) is relations.PrimaryKeyRelatedField and len(field.source_attrs) == 1:
+        # The foreign key column is already on the row; don't load the related object.
+        return attrgetter(field.source_attrs[0] + '_id')
+    get = attrgetter('.'.join(field.source_attrs))
+
+    def getter(obj):
+        try:
+            return get(obj)
+        except (AttributeError, ObjectDoesNotExist):
+            return None
+    return getter
+
+
+def _compile_field(field, request):
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    get = _getter(field)
+    if isinstance(field, serializers.ListSerializer):
+        child = compile_plan(field.child, request)
+        return lambda obj: [child(item) for item in _iterable(get(obj))]
+    if isinstance(field, relations.ManyRelatedField):
+        represent = _representer(field.child_relation, request)
+        return lambda obj: [represent(item) for item in _iterable(get(obj))]
+    if isinstance(field, serializers.BaseSerializer):
+        represent = compile_plan(field, request)
+    elif type(field) is relations.PrimaryKeyRelatedField:
+        represent = _identity
+    else:
+        represent = _representer(field, request)
+
+    def compiled(obj):
+        value = get(obj)
+        return None if value is None else represent(value)
+    return compiled
+
+
+def _iterable(value):
+    if value is None:
+        return ()
+    return value.all() if isinstance(value, Manager) else value
+
+
+def compile_plan(serializer, request=None):
+    """
+    Flatten a bound serializer into a function from an instance to the dict
+    `serializer.to_representation` would build, without DRF's per-object
+    field lookups. Fields with no fast equivalent keep their own
+    `to_representation`.
+    """
+    steps = [
+        (name, _compile_field(field, request))
+        for name, field in serializer.fields.items() if not field.write_only
+    ]
+
+    def serialize(obj):
+        return {name: fn(obj) for name, fn in steps}
+    return serialize
+
+
+class CompiledListSerializer:
+    """Read-only stand-in for `serializer_class(instances, many=True)`."""
+
+    def __init__(self, serializer_class, instances, context):
+        self.child = serializer_class(context=context)
+        self.instances = instances
+
+    @property
+    def data(self):
+        serialize = compile_plan(self.child, self.child.context.get('request'))
+        return [serialize(obj) for obj in self.instances]
+
+
+class CompiledListMixin:
+    """Serialize list responses through compiled plans; single objects and writes use DRF as before."""
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and 'data' not in kwargs:
+            context = kwargs.get('context') or self.get_serializer_context()
+            return CompiledListSerializer(self.get_serializer_class(), args[0], context)
+        return super().get_serializer(*args, **kwargs)
+
+
+def _field_tree(value):
+    """Parse 'id,user.username,media' into {'id': {}, 'user': {'username': {}}, 'media': {}}."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def prune_fields(serializer, fields, expand):
+    """
+    Drop the fields of `serializer` that aren't in the `fields` tree. Nested
+    serializers that are requested without subfields and aren't in the
+    `expand` tree collapse to primary keys.
+    """
+    for name in list(serializer.fields):
+        if name not in fields:
+            del serializer.fields[name]
+            continue
+        field = serializer.fields[name]
+        many = isinstance(field, serializers.ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, serializers.BaseSerializer):
+            continue
+        if fields[name]:
+            prune_fields(nested, fields[name], expand.get(name, {}))
+        elif name not in expand:
+            kwargs = {} if field.source == name else {'source': field.source}
+            serializer.fields[name] = relations.PrimaryKeyRelatedField(read_only=True, many=many, **kwargs)
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=id,caption,user.username` limits a GET response to the listed
+    fields. Nested objects named without subfields are returned as ids unless
+    also listed in `?expand=`. Without `fields` the response is unchanged.
+    Viewsets check `requested` and `expanded` to skip the joins, prefetches
+    and counts that only feed pruned fields.
+    """
+
+    def _sparse_params(self):
+        if not hasattr(self, '_sparse'):
+            params = self.request.query_params if self.request.method in permissions.SAFE_METHODS else {}
+            fields = _field_tree(params['fields']) if params.get('fields') else None
+            self._sparse = fields, _field_tree(params.get('expand', ''))
+        return self._sparse
+
+    def requested(self, name):
+        fields, _ = self._sparse_params()
+        return fields is None or name in fields
+
+    def expanded(self, name):
+        fields, expand = self._sparse_params()
+        return fields is None or (name in fields and (name in expand or bool(fields[name])))
+
+    def sparse(self, serializer):
+        fields, expand = self._sparse_params()
+        if fields is not None:
+            prune_fields(getattr(serializer, 'child', serializer), fields, expand)
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        return self.sparse(super().get_serializer(*args, **kwargs))
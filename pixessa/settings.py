@@ -56,6 +56,8 @@ INSTALLED_APPS = [
     'notifications',
     'blocks',
     'likes',
+    'mediastore',
+    'pixessa',
 ]
 
 SITE_ID = 1
@@ -68,6 +70,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pixessa.db_router.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -104,6 +107,56 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile, enabled with PIXESSA_DB_PROFILE=production: WAL so
+# readers never block the writer, pragmas applied on every new connection,
+# BEGIN IMMEDIATE so write transactions queue on the busy timeout instead of
+# failing with "database is locked" when upgrading a read lock, and persistent
+# connections. `manage.py bench_sqlite_writes` compares it with the defaults.
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-65536;'  # KiB, i.e. 64 MiB
+        'PRAGMA mmap_size=268435456;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,  # seconds to wait for the write lock
+}
+if os.environ.get('PIXESSA_DB_PROFILE') == 'production':
+    DATABASES['default'].update(
+        OPTIONS=SQLITE_PRODUCTION_OPTIONS,
+        CONN_MAX_AGE=600,
+        CONN_HEALTH_CHECKS=True,
+    )
+
+# Read replicas (pixessa.db_router). Locally, PIXESSA_DB_REPLICA can point at a
+# copy of db.sqlite3 to stand in for a replica.
+DATABASE_REPLICAS = []
+if os.environ.get('PIXESSA_DB_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['PIXESSA_DB_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['pixessa.db_router.ReplicaRouter']
+
+# The default cache must be shared by every worker process: it holds cached
+# responses (pixessa.cache) and the read-your-writes pins (pixessa.db_router).
+# The file cache covers processes on one host; across hosts use a shared
+# server such as Redis or Memcached. The entity versions that invalidate block
+# sets and cached responses need atomic increments, which the file cache
+# lacks, so they live in the database (pixessa.models.EntityVersion).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('PIXESSA_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -156,7 +209,11 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'pixessa.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -170,3 +227,95 @@ REST_AUTH = {
     'JWT_AUTH_COOKIE': 'access-token',
     'JWT_AUTH_REFRESH_COOKIE': 'refresh-token',
 }
+
+# Read notifications older than this are removed by `manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_PRUNE_BATCH_SIZE = 500
+
+# Like counter increments are buffered per worker and flushed in batches of
+# LIKE_COUNTER_FLUSH_SIZE, or by a background thread every LIKE_COUNTER_FLUSH_INTERVAL.
+LIKE_COUNTER_FLUSH_SIZE = 100
+LIKE_COUNTER_FLUSH_INTERVAL = 5  # seconds
+
+# Number of per-user block sets kept in each process, and how long one is
+# trusted before it is reloaded even though its version is unchanged.
+BLOCK_SET_CACHE_SIZE = 10000
+BLOCK_SET_MAX_AGE = 60  # seconds
+
+# The in-process follow graph is rebuilt from the database in the background
+# after this many seconds (the old one is served meanwhile), and compacted once
+# this many follow/unfollow deltas accumulate. pixessa.wsgi/asgi start building
+# it and the user search index at startup.
+FOLLOW_GRAPH_MAX_AGE = 300
+FOLLOW_GRAPH_MAX_DELTA = 10000
+
+# "People you may know" (manage.py build_suggestions).
+SUGGESTIONS_TOP_K = 50
+SUGGESTIONS_CHUNK_SIZE = 2000
+SUGGESTIONS_FOLLOWS_YOU_WEIGHT = 0.5
+
+# In-memory user search (accounts.search): rebuilt in the background after
+# USER_SEARCH_MAX_AGE seconds, with profile edits merged into the sorted key
+# list once USER_SEARCH_MAX_DELTA of them are pending.
+USER_SEARCH_MAX_AGE = 600
+USER_SEARCH_MAX_DELTA = 1000
+
+# Trending tags (posts.trending): decay time constant per window in seconds,
+# sketch dimensions, and where/how often the in-memory state is snapshotted.
+TRENDING_TAGS_WINDOWS = {'hour': 3600, 'day': 86400}
+TRENDING_TAGS_TOP_K = 100
+TRENDING_TAGS_SKETCH_WIDTH = 4096
+TRENDING_TAGS_SKETCH_DEPTH = 4
+TRENDING_TAGS_SNAPSHOT_PATH = os.path.join(BASE_DIR, 'trending_tags.npz')
+TRENDING_TAGS_SNAPSHOT_INTERVAL = 60  # seconds
+
+# Explore feed (manage.py rank_explore): posts from the last EXPLORE_WINDOW_DAYS,
+# ranked by log engagement with a comment counting as EXPLORE_COMMENT_WEIGHT likes;
+# a post needs e-times the engagement to match one EXPLORE_DECAY_SECONDS newer.
+EXPLORE_WINDOW_DAYS = 7
+EXPLORE_COMMENT_WEIGHT = 2
+EXPLORE_DECAY_SECONDS = 12 * 3600
+EXPLORE_CHUNK_SIZE = 2000
+# An incremental rank_explore run does a full one instead when entries are this old.
+EXPLORE_FULL_REFRESH_SECONDS = 6 * 3600
+
+# Image derivatives generated for each PostMedia upload (posts.imaging):
+# variant name -> longest side in pixels.
+POST_MEDIA_VARIANTS = {'thumb': 320, 'feed': 1080, 'full': 2048}
+POST_MEDIA_VARIANT_FORMAT = 'WEBP'  # falls back to JPEG when Pillow lacks WebP support
+POST_MEDIA_VARIANT_QUALITY = 82
+POST_MEDIA_WORKERS = 2
+
+# Uploaded media is stored by content digest under MEDIA_ROOT/<prefix>/ab/cd/ (mediastore).
+MEDIA_STORE_PREFIX = 'blobs'
+
+# Resumable uploads (posts.uploads). Partial files are kept outside MEDIA_ROOT
+# but should be on the same filesystem, so finalising is a rename.
+UPLOAD_SESSION_DIR = os.path.join(BASE_DIR, 'upload_sessions')
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = 24
+
+# Media serving (mediastore.views.serve_media). Set MEDIA_SENDFILE_HEADER to
+# 'X-Accel-Redirect' (nginx, with an internal location at MEDIA_SENDFILE_PREFIX)
+# or 'X-Sendfile' (Apache/lighttpd) to let the proxy transfer file bodies.
+MEDIA_SERVE = True
+MEDIA_CACHE_MAX_AGE = 3600  # files that are not content-addressed
+MEDIA_SENDFILE_HEADER = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+
+# Near-duplicate media (posts.similarity): maximum pHash Hamming distance
+# treated as the same picture, and how often each process reloads its index.
+MEDIA_HASH_RADIUS = 6
+MEDIA_HASH_INDEX_MAX_AGE = 600
+
+# Response cache for post detail, profile and comment-list GETs (pixessa.cache).
+# Entries are validated against per-entity versions in the database (see CACHES).
+# Each worker adds its hit/miss counts to the database every STATS_INTERVAL seconds.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TIMEOUT = 300
+RESPONSE_CACHE_STATS_INTERVAL = 30
+
+# After a user writes, their reads stay on the primary for this long so they
+# see their own writes despite replication lag.
+REPLICA_PIN_SECONDS = 5
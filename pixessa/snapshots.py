@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """
+    A per-process structure built from the database, such as the follow graph.
+
+    The first `get` builds it unless `warm` already has. Once it is older than
+    the `max_age_setting` setting, `get` keeps returning it while a single
+    background thread builds the replacement, so requests never wait for a
+    rebuild. `load()` must return an object with a `built_at` monotonic time.
+    """
+
+    def __init__(self, name, load, max_age_setting):
+        self.name = name
+        self.value = None
+        self._load = load
+        self._max_age_setting = max_age_setting
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def get(self):
+        value = self.value
+        if value is None:
+            with self._build_lock:
+                if self.value is None:
+                    self.value = self._load()
+                return self.value
+        if time.monotonic() - value.built_at > getattr(settings, self._max_age_setting):
+            self._rebuild_in_background()
+        return value
+
+    def warm(self):
+        """Start building in the background, e.g. at process startup."""
+        if self.value is None:
+            self._rebuild_in_background()
+
+    def reset(self):
+        self.value = None
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name=self.name, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            with self._build_lock:
+                self.value = self._load()
+        except Exception:
+            logger.exception('Could not build %s; serving the previous copy', self.name)
+        finally:
+            self._rebuilding = False
+            # This thread isn't a request, so nothing else closes its connection.
+            connection.close()
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+
+from accounts.models import User
+from posts.models import Post
+from .db_router import ReplicaMiddleware, ReplicaRouter
+
+router = ReplicaRouter()
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'],
+    REPLICA_PIN_SECONDS=5,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ReadAfterWriteTests(SimpleTestCase):
+    """Drive ReplicaMiddleware and ask ReplicaRouter where each query would go."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User(pk=7, username='writer')
+
+    def serve(self, method='get', user=None, write=False, models=(Post,)):
+        request = getattr(RequestFactory(), method)('/')
+        request.user = self.user if user is None else user
+        reads = []
+
+        def view(request):
+            if write:
+                router.db_for_write(Post)
+            reads.extend(router.db_for_read(model) for model in models)
+
+        ReplicaMiddleware(view)(request)
+        return reads
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.serve(), ['replica'])
+
+    def test_unsafe_requests_read_from_primary(self):
+        self.assertEqual(self.serve('post'), ['default'])
+
+    def test_writer_is_pinned_to_primary(self):
+        self.assertEqual(self.serve(write=True), ['default'])
+        self.assertEqual(self.serve(), ['default'])
+        # Other users keep reading from the replica.
+        self.assertEqual(self.serve(user=User(pk=8, username='reader')), ['replica'])
+        cache.clear()
+        self.assertEqual(self.serve(), ['replica'])
+
+    def test_unsafe_request_pins_writer(self):
+        self.serve('post', write=True)
+        self.assertEqual(self.serve(), ['default'])
+
+    def test_anonymous_writes_pin_nobody(self):
+        self.serve(user=AnonymousUser(), write=True)
+        self.assertEqual(self.serve(user=AnonymousUser()), ['replica'])
+
+    def test_authentication_reads_primary_until_user_is_known(self):
+        lazy = SimpleLazyObject(lambda: self.user)
+        self.assertEqual(self.serve(user=lazy, models=(User, Post)), ['default', 'replica'])
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
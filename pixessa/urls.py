@@ -1,20 +1,21 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 from accounts.api import UserViewSet, FollowRequestViewSet
-from posts.api import PostViewSet, CommentViewSet, PostMediaViewSet
+from posts.api import PostViewSet, CommentViewSet, PostMediaViewSet, TagViewSet, UploadSessionViewSet
 from likes.api import LikeViewSet
 from messaging.api import ConversationViewSet, MessageViewSet
 from notifications.api import NotificationViewSet
 from blocks.api import BlockViewSet
+from mediastore.views import serve_media
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'follow-requests', FollowRequestViewSet, basename='followrequest')
 router.register(r'posts', PostViewSet)
+router.register(r'tags', TagViewSet)
 router.register(r'likes', LikeViewSet)
 router.register(r'conversations', ConversationViewSet)
 router.register(r'notifications', NotificationViewSet)
@@ -23,6 +24,7 @@ router.register(r'blocks', BlockViewSet)
 posts_router = routers.NestedSimpleRouter(router, r'posts', lookup='post')
 posts_router.register(r'media', PostMediaViewSet, basename='post-media')
 posts_router.register(r'comments', CommentViewSet, basename='post-comments')
+posts_router.register(r'uploads', UploadSessionViewSet, basename='post-uploads')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -36,5 +38,7 @@ urlpatterns = [
     }), name='conversation-messages'),
 
     path('api/', include(router.urls)),
+]
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.MEDIA_SERVE:
+    urlpatterns.append(re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media))
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pixessa.settings')
 
 application = get_wsgi_application()
+
+# Build the follow graph and user search index before the first search needs them.
+from accounts.graph import warm_graph  # noqa: E402
+from accounts.search import warm_index  # noqa: E402
+
+warm_graph()
+warm_index()
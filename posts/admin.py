@@ -34,9 +34,11 @@ class PostMediaAdmin(admin.ModelAdmin):
         'file',
         'media_type',
         'order',
+        'duplicate_of',
         'created_at',
     )
     list_filter = ('post', 'created_at')
+    raw_id_fields = ('post', 'duplicate_of')
     date_hierarchy = 'created_at'
 
 
@@ -1,13 +1,68 @@
-from rest_framework import serializers, viewsets, permissions, status
+import base64
+import binascii
+import re
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import CharField, Count, Max, OuterRef, Subquery, prefetch_related_objects
+from django.db.models.functions import Cast
+from rest_framework import mixins, serializers, viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 
 
 from accounts.api import UserSerializer
+from blocks.cache import blocked_user_ids, exclude_blocked
 from hate_speech_model.preprocessing import preprocess_text
 from hate_speech_model.utils.model_loader import load_model
-from .models import Post, PostMedia, Comment, Tag
+from likes.models import Like
+from mediastore.storage import atomic_files
+from pixessa.cache import cached_response
+from pixessa.conditional import conditional, validators
+from pixessa.db_router import on_primary, on_replica
+from pixessa.models import EntityVersion
+from pixessa.serializers import CompiledListMixin, SparseFieldsMixin
+from .imaging import schedule_processing
+from .models import ExploreEntry, Post, PostMedia, Comment, Tag, UploadSession
+from .search import search_posts
+from .similarity import media_hash_index
+from .trending import trending_tags
+from .uploads import AlreadyFinalized, ChecksumMismatch, OffsetMismatch, PartMissing, append_chunk, discard, finalize
+
+User = get_user_model()
+
+
+def viewer_flags(user, posts):
+    """
+    Work out which of `posts` the viewer liked and whose authors they follow,
+    with one query per relation for the whole page.
+    """
+    if not user or not user.is_authenticated or not posts:
+        return {'liked_post_ids': set(), 'followed_user_ids': set()}
+    liked_post_ids = set(Like.objects.filter(
+        user=user,
+        content_type=ContentType.objects.get_for_model(Post),
+        object_id__in=[post.id for post in posts],
+    ).values_list('object_id', flat=True))
+    followed_user_ids = set(user.following.filter(
+        id__in={post.user_id for post in posts}
+    ).values_list('id', flat=True))
+    return {'liked_post_ids': liked_post_ids, 'followed_user_ids': followed_user_ids}
+
+
+def page_counts(posts):
+    """Like and comment counts for a page of posts, one grouped query each."""
+    ids = [post.id for post in posts]
+    likes = Like.objects.filter(
+        content_type=ContentType.objects.get_for_model(Post), object_id__in=ids,
+    ).values('object_id').annotate(n=Count('id')).values_list('object_id', 'n')
+    comments = Comment.objects.filter(post_id__in=ids).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n')
+    return {'likes_counts': dict(likes), 'comments_counts': dict(comments)}
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -16,10 +71,54 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
+class TagViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = TagSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    queryset = Tag.objects.all()
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        window = request.query_params.get('window', 'hour')
+        engine = trending_tags()
+        if window not in engine.windows:
+            return Response(
+                {'error': f"window must be one of {', '.join(engine.windows)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        # Over-fetch a little so deleted tags don't shorten the list.
+        ranked = engine.top(window, limit + 10)
+        tags = Tag.objects.in_bulk([tag_id for tag_id, _ in ranked])
+        data = [
+            {'id': tag_id, 'name': tags[tag_id].name, 'score': round(score, 3)}
+            for tag_id, score in ranked if tag_id in tags
+        ]
+        return Response(data[:limit])
+
+
 class PostMediaSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = PostMedia
-        fields = ['id', 'file', 'media_type', 'order']
+        fields = ['id', 'file', 'media_type', 'order', 'variants',
+                  'width', 'height', 'byte_size', 'dominant_color', 'placeholder']
+        read_only_fields = ['width', 'height', 'byte_size', 'dominant_color', 'placeholder']
+
+    def get_variants(self, obj):
+        request = self.context.get('request')
+        variants = {}
+        for name, variant in (obj.variants or {}).items():
+            url = obj.file.storage.url(variant['name'])
+            variants[name] = {
+                'url': request.build_absolute_uri(url) if request else url,
+                'width': variant['width'],
+                'height': variant['height'],
+            }
+        return variants
 
 
 class PostSerializer(serializers.ModelSerializer):
@@ -28,18 +127,42 @@ class PostSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     likes_count = serializers.SerializerMethodField()
     comments_count = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    author_followed = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = ['id', 'user', 'caption', 'location', 'tags',
-                  'media', 'created_at', 'likes_count', 'comments_count']
+                  'media', 'created_at', 'likes_count', 'comments_count',
+                  'is_liked', 'author_followed']
         read_only_fields = ['user']
 
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        counts = self.context.get('likes_counts')
+        return obj.likes.count() if counts is None else counts.get(obj.id, 0)
 
     def get_comments_count(self, obj):
-        return obj.comments.count()
+        counts = self.context.get('comments_counts')
+        return obj.comments.count() if counts is None else counts.get(obj.id, 0)
+
+    def _viewer_flags(self, obj):
+        # List views precompute the flags for the whole page; single objects fall back to a
+        # lookup, memoized so is_liked and author_followed share it.
+        flags = self.context.get('viewer_flags')
+        if flags is None:
+            if not hasattr(self, '_flags_cache'):
+                self._flags_cache = {}
+            if obj.pk not in self._flags_cache:
+                request = self.context.get('request')
+                self._flags_cache[obj.pk] = viewer_flags(request and request.user, [obj])
+            flags = self._flags_cache[obj.pk]
+        return flags
+
+    def get_is_liked(self, obj):
+        return obj.id in self._viewer_flags(obj)['liked_post_ids']
+
+    def get_author_followed(self, obj):
+        return obj.user_id in self._viewer_flags(obj)['followed_user_ids']
 
     def create(self, validated_data):
         # Automatically assign the logged in user as the post creator.
@@ -47,23 +170,169 @@ class PostSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+def post_dependencies(view):
+    viewer = view.request.user.pk or 0
+    dependencies = [('post', view.kwargs['pk']), ('following', viewer), ('blocks', viewer)]
+    try:
+        author = Post.objects.filter(pk=view.kwargs['pk']).values_list('user_id', flat=True).first()
+    except (TypeError, ValueError):
+        author = None
+    if author is not None:
+        dependencies.append(('user', author))
+    return dependencies
+
+
+def comment_dependencies(view):
+    return [('comments', view.kwargs['post_pk']), ('blocks', view.request.user.pk or 0)]
+
+
+def post_validator(view):
+    try:
+        row = view.get_queryset().filter(pk=view.kwargs['pk']).values_list('user_id', 'updated_at').first()
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+    viewer = view.request.user.pk or 0
+    dependencies = [('post', view.kwargs['pk']), ('user', row[0]), ('following', viewer), ('blocks', viewer)]
+    return validators(dependencies, [row[1]])
+
+
+def latest_version(scope, key):
+    return Subquery(
+        EntityVersion.objects.filter(scope=scope, key=Cast(key, CharField())).values('version')[:1]
+    )
+
+
+def post_list_validator(posts, viewer):
+    """
+    Describe a post list with one aggregate: its size, latest edit and the
+    newest version of any listed post or author. The ('posts', 'list')
+    version moves on every create and delete, so removing an older post
+    still advances Last-Modified.
+    """
+    posts = posts.aggregate(
+        count=Count('id'),
+        latest=Max('updated_at'),
+        post_version=Max(latest_version('post', OuterRef('pk'))),
+        user_version=Max(latest_version('user', OuterRef('user_id'))),
+    )
+    dependencies = [('posts', 'list'), ('following', viewer), ('blocks', viewer)]
+    return validators(
+        dependencies, [posts['latest']], extra=[posts['count']],
+        stamps=[posts['post_version'], posts['user_version']],
+    )
+
+
+def comment_list_validator(view):
+    comments = view.get_queryset().aggregate(count=Count('id'), latest=Max('updated_at'))
+    return validators(comment_dependencies(view), [comments['latest']], extra=[comments['count']])
+
+
+def encode_cursor(score, post_id):
+    return base64.urlsafe_b64encode(f'{score!r}:{post_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class SearchPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+class PostViewSet(SparseFieldsMixin, CompiledListMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = Post.objects.none()
 
     def get_queryset(self):
-        return Post.objects.all().prefetch_related('media', 'tags')
+        return exclude_blocked(self.with_related(Post.objects.all()), self.request.user)
+
+    def with_related(self, posts):
+        # Only join and prefetch what the requested fields will read.
+        if self.expanded('user'):
+            posts = posts.select_related('user')
+        return posts.prefetch_related(*[name for name in ('media', 'tags') if self.requested(name)])
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args:
+            posts = list(args[0])
+            kwargs.setdefault('context', self.get_serializer_context())
+            if self.requested('is_liked') or self.requested('author_followed'):
+                kwargs['context']['viewer_flags'] = viewer_flags(self.request.user, posts)
+            if self.requested('likes_count') or self.requested('comments_count'):
+                kwargs['context'].update(page_counts(posts))
+            args = (posts,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
+
+    @conditional(post_validator)
+    @cached_response('post-detail', post_dependencies)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional(lambda view: post_list_validator(view.get_queryset(), view.request.user.pk or 0))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            post = serializer.save()
+            User.objects.adjust_count(post.user_id, 'posts_count', 1)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            User.objects.adjust_count(instance.user_id, 'posts_count', -1)
 
     @action(detail=False, methods=['get'])
+    @conditional(lambda view: post_list_validator(view.feed_queryset(), view.request.user.pk))
     def feed(self, request):
-        following_ids = request.user.following.values_list('id', flat=True)
-        posts = Post.objects.filter(user__in=following_ids).order_by('-created_at')
+        posts = self.with_related(self.feed_queryset())
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
 
+    def feed_queryset(self):
+        following_ids = self.request.user.following.values_list('id', flat=True)
+        posts = exclude_blocked(Post.objects.filter(user__in=following_ids), self.request.user)
+        # A feed a few seconds behind is fine, even right after the viewer wrote something.
+        return on_replica(posts.order_by('-created_at'))
 
-class PostMediaViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def explore(self, request):
+        after = None
+        if 'cursor' in request.query_params:
+            after = decode_cursor(request.query_params['cursor'])
+            if after is None:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        entries = list(exclude_blocked(ExploreEntry.objects.ranked(after), request.user)[:limit])
+        posts = [entry.post for entry in entries]
+        prefetch_related_objects(posts, *[name for name in ('media', 'tags') if self.requested(name)])
+        serializer = self.get_serializer(posts, many=True)
+        next_cursor = None
+        if len(entries) == limit:
+            next_cursor = encode_cursor(entries[-1].score, entries[-1].post_id)
+        return Response({'results': serializer.data, 'next': next_cursor})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        posts = search_posts(request.query_params.get('q', ''), request.user)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(self.with_related(posts), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class PostMediaViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """
     This viewset allows you to create and manage PostMedia instances via multipart form data.
     It is assumed that this viewset is nested under the Post endpoint (e.g. /posts/{post_pk}/media/).
@@ -79,7 +348,120 @@ class PostMediaViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Get the parent post and save the media instance with it.
         post = Post.objects.get(pk=self.kwargs['post_pk'])
-        serializer.save(post=post)
+        with atomic_files():
+            media = serializer.save(post=post)
+        transaction.on_commit(partial(schedule_processing, media.pk))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, post_pk=None, pk=None):
+        """Other media whose perceptual hash is within MEDIA_HASH_RADIUS bits of this one's."""
+        media = self.get_object()
+        if not media.phash:
+            return Response({'error': 'Media has not been hashed yet'}, status=status.HTTP_409_CONFLICT)
+        try:
+            radius = min(int(request.query_params.get('radius', settings.MEDIA_HASH_RADIUS)),
+                         settings.MEDIA_HASH_RADIUS)
+        except ValueError:
+            return Response({'error': 'radius must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        matches = media_hash_index().query(int(media.phash, 16), radius, exclude=media.pk)[:50]
+        visible = exclude_blocked(PostMedia.objects.all(), request.user, field='post__user')
+        found = visible.in_bulk([media_id for media_id, _ in matches])
+        data = [
+            {'id': media_id, 'post': found[media_id].post_id, 'distance': distance}
+            for media_id, distance in matches if media_id in found
+        ]
+        return Response(data)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'media_type', 'order', 'size', 'sha256', 'offset', 'created_at']
+        read_only_fields = ['id', 'offset', 'created_at']
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Uploads must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.')
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError('Expected a hex SHA-256 digest.')
+        return value
+
+
+class UploadSessionViewSet(SparseFieldsMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads, nested under a post (/posts/{post_pk}/uploads/).
+
+    Create a session with the file's name, size and SHA-256, PUT raw bytes to
+    `chunk/` with an Upload-Offset header, and POST `finalize/` once every byte
+    has arrived. After a dropped connection, GET the session to learn where to
+    resume.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        # Clients resume from the offset read here, so it must never lag behind a chunk just written.
+        return on_primary(UploadSession.objects.filter(post_id=self.kwargs['post_pk'], user=self.request.user))
+
+    def perform_create(self, serializer):
+        post = Post.objects.get(pk=self.kwargs['post_pk'])
+        serializer.save(post=post, user=self.request.user)
+
+    def perform_destroy(self, instance):
+        discard(instance)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, post_pk=None, pk=None):
+        session = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Upload-Offset and Content-Length headers are required'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE or offset + length > session.size:
+            return Response({'error': 'Chunk too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            received = append_chunk(session, offset, request.stream, length)
+        except OffsetMismatch as exc:
+            return Response(
+                {'error': 'Offset mismatch', 'offset': exc.offset},
+                status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': str(exc.offset)},
+            )
+        return Response({'offset': received}, headers={'Upload-Offset': str(received)})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, post_pk=None, pk=None):
+        session = self.get_object()
+        if session.offset != session.size:
+            return Response(
+                {'error': 'Upload incomplete', 'offset': session.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            media = finalize(session)
+        except ChecksumMismatch:
+            return Response(
+                {'error': 'Checksum mismatch; upload again from offset 0', 'offset': 0},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except PartMissing:
+            return Response(
+                {'error': 'Upload data lost; upload again from offset 0', 'offset': 0},
+                status=status.HTTP_409_CONFLICT, headers={'Upload-Offset': '0'},
+            )
+        except AlreadyFinalized:
+            return Response({'error': 'Upload already finalized'}, status=status.HTTP_409_CONFLICT)
+        transaction.on_commit(partial(schedule_processing, media.pk))
+        serializer = PostMediaSerializer(media, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -92,19 +474,32 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'is_offensive', 'hate_score']
 
     def get_replies(self, obj):
-        return CommentSerializer(obj.replies.all(), many=True).data
+        # Filtered in Python so the prefetched replies are reused.
+        hidden = self.context.get('blocked_user_ids', frozenset())
+        replies = [reply for reply in obj.replies.all() if reply.user_id not in hidden]
+        return CommentSerializer(replies, many=True, context=self.context).data
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SparseFieldsMixin, CompiledListMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         # Only return comments for the given post.
-        return Comment.objects.filter(
+        comments = Comment.objects.filter(
             post_id=self.kwargs['post_pk'],
             is_offensive=False
         )
+        if self.requested('user'):
+            comments = comments.select_related('user')
+        if self.requested('replies'):
+            comments = comments.prefetch_related('replies__user')
+        return exclude_blocked(comments, self.request.user)
+
+    @conditional(comment_list_validator)
+    @cached_response('comment-list', comment_dependencies)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         # Get the associated post
@@ -156,5 +551,6 @@ class CommentViewSet(viewsets.ModelViewSet):
         # Add post_pk to context for hyperlinked relationships
         context = super().get_serializer_context()
         context['post_pk'] = self.kwargs['post_pk']
+        context['blocked_user_ids'] = blocked_user_ids(self.request.user)
         return context
 
@@ -0,0 +1,109 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils import timezone
+
+from likes.models import Like
+from .models import Comment, ExploreEntry, Post
+
+
+def explore_score(likes, comments, created_at):
+    """
+    Engagement on a log scale plus a term that grows linearly with post time.
+
+    Raising newer posts instead of decaying older ones is equivalent for ranking
+    (every score decays by the same amount as time passes), but keeps stored
+    scores comparable, so only posts with new activity need to be rescored.
+    """
+    engagement = likes + settings.EXPLORE_COMMENT_WEIGHT * comments
+    return math.log1p(engagement) + created_at.timestamp() / settings.EXPLORE_DECAY_SECONDS
+
+
+def score_posts(post_ids, now=None):
+    """Rescore the given posts, dropping entries for posts no longer eligible."""
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.EXPLORE_WINDOW_DAYS)
+    posts = {
+        post_id: (user_id, created_at)
+        for post_id, user_id, created_at in Post.objects.filter(
+            id__in=post_ids, user__is_private=False, user__is_active=True, created_at__gte=since,
+        ).values_list('id', 'user_id', 'created_at')
+    }
+    # Counted from Like rather than LikeCounter, whose increments are buffered in the web workers.
+    likes = dict(
+        Like.objects.filter(content_type=ContentType.objects.get_for_model(Post), object_id__in=posts)
+        .values('object_id').annotate(n=models.Count('id')).values_list('object_id', 'n')
+    )
+    comments = dict(
+        Comment.objects.filter(post_id__in=posts, is_offensive=False)
+        .values('post_id').annotate(n=models.Count('id')).values_list('post_id', 'n')
+    )
+    entries = [
+        ExploreEntry(
+            post_id=post_id, user_id=user_id, computed_at=now,
+            score=explore_score(likes.get(post_id, 0), comments.get(post_id, 0), created_at),
+        )
+        for post_id, (user_id, created_at) in posts.items()
+    ]
+    with transaction.atomic():
+        ExploreEntry.objects.filter(post_id__in=set(post_ids) - set(posts)).delete()
+        ExploreEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['user', 'score', 'computed_at'],
+        )
+    return len(entries)
+
+
+def _chunks(ids, size):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def refresh_explore(full=False, chunk_size=None):
+    """
+    Recompute explore entries and return (scored, removed).
+
+    A full run rescores every public post in the window and drops everything
+    else. An incremental run rescores only posts created, liked or commented
+    on since the previous run; unlikes and privacy changes wait for the next
+    full run. Incremental runs turn into full ones once some entry has gone
+    EXPLORE_FULL_REFRESH_SECONDS without being rescored.
+    """
+    chunk_size = chunk_size or settings.EXPLORE_CHUNK_SIZE
+    now = timezone.now()
+    window_start = now - timedelta(days=settings.EXPLORE_WINDOW_DAYS)
+    last_run = None
+    if not full:
+        runs = ExploreEntry.objects.aggregate(last=models.Max('computed_at'), oldest=models.Min('computed_at'))
+        full_due = now - timedelta(seconds=settings.EXPLORE_FULL_REFRESH_SECONDS)
+        if runs['oldest'] is not None and runs['oldest'] > full_due:
+            last_run = runs['last']
+
+    if last_run is None:
+        candidates = Post.objects.filter(
+            created_at__gte=window_start, user__is_private=False
+        ).values_list('id', flat=True)
+        removed, _ = ExploreEntry.objects.filter(
+            models.Q(post__created_at__lt=window_start) | models.Q(user__is_private=True)
+        ).delete()
+    else:
+        recent = models.Q(created_at__gte=window_start)
+        candidates = set(Post.objects.filter(recent, created_at__gte=last_run).values_list('id', flat=True))
+        candidates.update(
+            Like.objects.filter(
+                content_type=ContentType.objects.get_for_model(Post), created_at__gte=last_run,
+            ).values_list('object_id', flat=True)
+        )
+        candidates.update(Comment.objects.filter(created_at__gte=last_run).values_list('post_id', flat=True))
+        removed, _ = ExploreEntry.objects.filter(post__created_at__lt=window_start).delete()
+
+    scored = 0
+    for chunk in _chunks(candidates, chunk_size):
+        scored += score_posts(chunk, now)
+    return scored, removed
@@ -0,0 +1,227 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from PIL import Image, ImageOps, features
+
+from mediastore.storage import atomic_files
+from pixessa.cache import bump
+from .similarity import dhash, media_hash_index, phash, to_hex
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 0x0112
+
+
+def _output_format():
+    fmt = settings.POST_MEDIA_VARIANT_FORMAT.upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return fmt
+
+
+def _prepare(image, fmt):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha: flatten onto white rather than letting transparent areas go black.
+        if image.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        return image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    return image
+
+
+def render_variants(source):
+    """
+    Yield (name, data, width, height) for each size in POST_MEDIA_VARIANTS.
+
+    The image is rotated according to its EXIF orientation first; the encoded
+    variants carry no EXIF block, so GPS and camera data never leave the server.
+    Images are never upscaled.
+    """
+    fmt = _output_format()
+    with Image.open(source) as image:
+        image.draft('RGB', (settings.POST_MEDIA_VARIANTS['full'],) * 2)
+        icc_profile = image.info.get('icc_profile')
+        image = _prepare(ImageOps.exif_transpose(image), fmt)
+        for name, longest_side in sorted(settings.POST_MEDIA_VARIANTS.items(), key=lambda item: -item[1]):
+            if max(image.size) > longest_side:
+                # Resize from the previous (larger) variant, which is much cheaper than the original.
+                image = image.copy()
+                image.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+            out = BytesIO()
+            options = {'quality': settings.POST_MEDIA_VARIANT_QUALITY}
+            if icc_profile:
+                options['icc_profile'] = icc_profile
+            if fmt == 'JPEG':
+                options.update(optimize=True, progressive=True)
+            else:
+                options['method'] = 4
+            image.save(out, fmt, **options)
+            yield name, out.getvalue(), image.width, image.height
+
+
+def generate_variants(media):
+    """Render and store the derivatives of `media`, recording them on `media.variants`."""
+    storage = media.file.storage
+    extension = '.jpg' if _output_format() == 'JPEG' else f'.{_output_format().lower()}'
+    base = posixpath.join('post_media', 'variants', str(media.pk))
+    variants = {}
+    with media.file.open('rb') as source:
+        rendered = list(render_variants(source))
+    old = media.variants or {}
+    with atomic_files():
+        for name, data, width, height in rendered:
+            path = posixpath.join(base, name + extension)
+            variants[name] = {'name': storage.save(path, ContentFile(data)), 'width': width, 'height': height}
+        type(media).objects.filter(pk=media.pk).update(variants=variants)
+    media.variants = variants
+    bump('post', media.post_id)
+    # Release the previous files only now, so the row never points at a missing file.
+    delete_variant_files(storage, old)
+    return variants
+
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _base83(value, length):
+    return ''.join(BASE83[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+def _to_linear(srgb):
+    v = srgb / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _to_srgb(linear):
+    v = min(max(linear, 0.0), 1.0)
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(pixels, x_components=4, y_components=3):
+    """Encode an (h, w, 3) uint8 RGB array as a BlurHash string (https://blurha.sh)."""
+    height, width = pixels.shape[:2]
+    linear = _to_linear(pixels.astype(np.float64))
+    cos_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    cos_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    # factors[j, i] = sum over pixels of cos_y[j, y] * cos_x[i, x] * colour[y, x]
+    factors = np.einsum('jy,ix,yxc->jic', cos_y, cos_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += _base83(quantised_max, 1)
+    r, g, b = (_to_srgb(c) for c in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    quantised = np.clip(np.floor(np.sign(ac) * np.abs(ac / maximum) ** 0.5 * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
+
+
+def image_metadata(source):
+    """Oriented dimensions, dominant colour, BlurHash placeholder and perceptual hashes of an image file."""
+    with Image.open(source) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+        # Everything else only needs a thumbnail, which JPEG can decode at a fraction of the cost.
+        image.draft('RGB', (64, 64))
+        oriented = ImageOps.exif_transpose(image).convert('RGB')
+    small = oriented.copy()
+    small.thumbnail((32, 32), Image.Resampling.BOX)
+    palette = small.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, index = max(palette.getcolors())
+    r, g, b = palette.getpalette()[index * 3:index * 3 + 3]
+    return {
+        'width': width,
+        'height': height,
+        'dominant_color': f'#{r:02x}{g:02x}{b:02x}',
+        'placeholder': blurhash(np.asarray(small)),
+        'dhash': to_hex(dhash(oriented)),
+        'phash': to_hex(phash(oriented)),
+    }
+
+
+def find_duplicate(media, value):
+    """Id of the closest existing media within MEDIA_HASH_RADIUS of hash `value`, or None."""
+    matches = media_hash_index().query(value, exclude=media.pk)[:10]
+    # The index may still hold media deleted since it was built.
+    existing = set(type(media).objects.filter(pk__in=[media_id for media_id, _ in matches])
+                   .values_list('pk', flat=True))
+    return next((media_id for media_id, _ in matches if media_id in existing), None)
+
+
+def record_metadata(media):
+    """Store size (and for images, dimensions, previews and any near-duplicate) on `media`."""
+    fields = {'byte_size': media.file.size}
+    if media.media_type == 'image':
+        with media.file.open('rb') as source:
+            fields.update(image_metadata(source))
+        fields['duplicate_of_id'] = find_duplicate(media, int(fields['phash'], 16))
+    for name, value in fields.items():
+        setattr(media, name, value)
+    type(media).objects.filter(pk=media.pk).update(**fields)
+    bump('post', media.post_id)
+    if fields.get('phash'):
+        media_hash_index().add(media.pk, int(fields['phash'], 16))
+    return fields
+
+
+def delete_variant_files(storage, variants):
+    for variant in variants.values():
+        storage.delete(variant['name'])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _executor_pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.POST_MEDIA_WORKERS, thread_name_prefix='post-media'
+                )
+    return _executor
+
+
+def _process(media_id):
+    from .models import PostMedia
+
+    try:
+        media = PostMedia.objects.filter(pk=media_id).first()
+        if media is not None:
+            record_metadata(media)
+            if media.media_type == 'image':
+                generate_variants(media)
+    except Exception:
+        # Missed media is picked up again by `backfill_media_metadata` / `generate_media_variants`.
+        logger.exception('Could not process PostMedia %s', media_id)
+    finally:
+        # Pool threads outlive requests, so close their connections explicitly.
+        connections.close_all()
+
+
+def schedule_processing(media_id):
+    """Queue metadata extraction and derivative generation on the worker pool, off the request thread."""
+    return _executor_pool().submit(_process, media_id)
@@ -0,0 +1,437 @@
+import inspect
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models.expressions import Col
+from django.db.models.sql import Query
+from django.test import RequestFactory
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.request import Request
+
+from accounts.models import FollowRequest, User
+from blocks.models import Block
+from messaging.models import Conversation, Message
+from notifications.models import Notification
+from pixessa.bench import scratch_data
+from posts.models import Comment, Post, Tag
+
+EQUALITY_LOOKUPS = ('exact', 'in', 'isnull')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'range')
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+SCAN = re.compile(r'^SCAN (\S+)(?: USING (?:COVERING )?INDEX (\S+))?')
+SEARCH = re.compile(r'^SEARCH (\S+) USING (?:COVERING |INTEGER PRIMARY )?(?:INDEX (\S+) )?\((.*)\)')
+TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (.*)')
+CONSTRAINED_COLUMN = re.compile(r'(\w+)\s*(?:=|>|<|IN\b)')
+
+# Findings that no index fixes, by (query, finding), with the reason. Anything
+# else the audit flags fails the command.
+ACCEPTED = {
+    ('PostViewSet.feed_queryset', 'temp B-tree for ORDER BY'):
+        "SQLite can't merge the per-author ranges of `user_id IN (...)` into one ordered walk",
+    ('UserManager.active_users', 'full scan of accounts_user'):
+        'nearly every user is active, so no index on is_active would be selective',
+}
+
+
+class QueryRefused(Exception):
+    pass
+
+
+class Target:
+    """One query to explain: its SQL and, when known, the Query it was compiled from."""
+
+    def __init__(self, label, sql, params, query=None):
+        self.label = label
+        self.sql = sql
+        self.params = params
+        self.query = query
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the list querysets of every routed viewset and the queries built by every project '
+        'manager method against seeded data, flag full scans, partial index matches and temp B-tree '
+        'sorts, and propose the indexes (and migrations) that fix them. Seeds inside a rolled-back '
+        'transaction.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('audit_query_plans reads SQLite query plans.')
+        self.tables = {model._meta.db_table: model for model in apps.get_models(include_auto_created=True)}
+        self.project_modules = {
+            config.name for config in apps.get_app_configs()
+            if Path(config.path).resolve().is_relative_to(settings.BASE_DIR)
+        }
+        with scratch_data():
+            objects = self.seed()
+            targets, skipped = [], []
+            for label, outcome in [*self.viewset_queries(objects), *self.manager_queries(objects)]:
+                if isinstance(outcome, Target):
+                    targets.append(outcome)
+                else:
+                    skipped.append((label, outcome))
+            proposals = {}
+            flagged = unresolved = 0
+            for target in targets:
+                plan = self.explain(target)
+                findings = self.findings(target, plan)
+                flagged += bool(findings)
+                if findings or options['verbosity'] > 1:
+                    self.stdout.write(target.label)
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+                for message, model, proposal, fixable in findings:
+                    accepted = ACCEPTED.get((target.label, message))
+                    if accepted:
+                        self.stdout.write(f'  - {message} (accepted: {accepted})')
+                    elif not fixable:
+                        self.stdout.write(f'  - {message}')
+                    else:
+                        unresolved += 1
+                        self.stdout.write(self.style.WARNING(f'  ! {message}'))
+                    if proposal:
+                        proposals.setdefault((model, *proposal), []).append(target.label)
+            if options['verbosity'] > 1:
+                for label, reason in skipped:
+                    self.stdout.write(f'{label}: skipped ({reason})')
+        self.stdout.write(
+            f'{len(targets)} queries explained, {flagged} flagged, {unresolved} unresolved, '
+            f'{len(skipped)} methods skipped'
+        )
+        self.propose(proposals)
+        if unresolved:
+            raise CommandError(
+                f'{unresolved} unresolved query plan finding(s): add the proposed indexes, '
+                f'or list findings no index can fix in ACCEPTED with the reason.'
+            )
+        self.stdout.write(self.style.SUCCESS('No unresolved findings.'))
+
+    # Seeding
+
+    def seed(self):
+        users = User.objects.bulk_create([
+            User(username=f'audit-{i}', email=f'audit-{i}@example.com', is_private=False) for i in range(4)
+        ])
+        user, other = users[:2]
+        user.following.add(other, users[2])
+        Block.objects.create(blocker=user, blocked=users[3])
+        post = Post.objects.create(user=other, caption='audit')
+        post.tags.add(Tag.objects.create(name='audit-tag'))
+        comment = Comment.objects.create(post=post, user=other, content='audit')
+        conversation = Conversation.objects.create()
+        conversation.participants.add(user, other)
+        message = Message.objects.create(conversation=conversation, sender=other, content='audit')
+        content_type = ContentType.objects.get_for_model(Post)
+        notification = Notification.objects.create(
+            user=user, notification_type='comment', content_type=content_type, object_id=post.pk,
+        )
+        follow_request = FollowRequest.objects.create(requester=other, receiver=user)
+        return {
+            'user': user, 'other': other, 'post': post, 'comment': comment, 'conversation': conversation,
+            'message': message, 'notification': notification, 'content_type': content_type,
+            'follow_request': follow_request,
+        }
+
+    # Discovery
+
+    def viewset_queries(self, objects):
+        """The list queryset of every routed viewset, plus any `*_queryset` helper it defines."""
+        seen = set()
+        for callback, params in self.routes(get_resolver().url_patterns, ()):
+            view_class = getattr(callback, 'cls', None)
+            actions = getattr(callback, 'actions', None) or {}
+            if actions.get('get') != 'list' or view_class in seen:
+                continue
+            seen.add(view_class)
+            kwargs = {name: objects[name[:-len('_pk')]].pk for name in params if name.endswith('_pk')}
+            request = Request(RequestFactory().get('/'))
+            request.user = objects['user']
+            view = view_class(**callback.initkwargs)
+            view.action_map, view.action, view.request = actions, 'list', request
+            view.args, view.kwargs, view.format_kwarg, view.headers = (), kwargs, None, {}
+            # Viewsets may read while building a queryset (e.g. the viewer's block list).
+            yield self.target(f'{view_class.__name__}.list', lambda: view.filter_queryset(view.get_queryset()),
+                              reads=True)
+            for name, method in self.project_methods(view_class):
+                if name.endswith('_queryset') and name != 'get_queryset':
+                    yield self.target(f'{view_class.__name__}.{name}', method.__get__(view), reads=True)
+
+    def routes(self, patterns, params):
+        for pattern in patterns:
+            names = (*params, *pattern.pattern.regex.groupindex)
+            if isinstance(pattern, URLResolver):
+                yield from self.routes(pattern.url_patterns, names)
+            else:
+                yield pattern.callback, names
+
+    def manager_queries(self, objects):
+        """Every public method of the project's managers that can be called with seeded objects."""
+        for model in apps.get_models():
+            if model.__module__.split('.')[0] not in self.project_modules:
+                continue
+            for manager in model._meta.managers:
+                for name, method in self.project_methods(type(manager)):
+                    label = f'{type(manager).__name__}.{name}'
+                    arguments = self.arguments(method, objects)
+                    if isinstance(arguments, str):
+                        yield label, arguments
+                    else:
+                        yield self.target(label, lambda: method(manager, *arguments))
+
+    def project_methods(self, cls):
+        seen = set()
+        for klass in cls.__mro__:
+            if klass.__module__.split('.')[0] not in self.project_modules:
+                continue
+            for name, member in vars(klass).items():
+                if name.startswith('_') or name in seen or not inspect.isfunction(member):
+                    continue
+                seen.add(name)
+                yield name, member
+
+    def arguments(self, method, objects):
+        values = {
+            'user': objects['user'], 'follower': objects['user'], 'sender': objects['user'],
+            'blocker': objects['user'], 'requester': objects['user'],
+            'followed': objects['other'], 'receiver': objects['other'], 'blocked': objects['other'],
+            'user_id': objects['user'].pk, 'user_ids': [objects['other'].pk],
+            'post': objects['post'], 'obj': objects['post'], 'content_object': objects['post'],
+            'comment': objects['comment'], 'conversation': objects['conversation'],
+            'notification': objects['notification'], 'request': objects['follow_request'],
+            'content_type': objects['content_type'], 'object_id': objects['post'].pk,
+            'object_ids': [objects['post'].pk], 'message_ids': [objects['message'].pk],
+            'request_ids': [objects['follow_request'].pk],
+            'participants': [objects['user'], objects['other']], 'older_than': timezone.now(),
+        }
+        arguments = []
+        for parameter in list(inspect.signature(method).parameters.values())[1:]:
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                continue
+            if parameter.name in values:
+                arguments.append(values[parameter.name])
+            elif parameter.default is parameter.empty:
+                return f'no seeded value for {parameter.name!r}'
+            else:
+                break
+        return arguments
+
+    def target(self, label, build, reads=False):
+        """
+        Run `build` with the database refused (reads too, unless `reads`).
+        Lazy querysets come back whole; otherwise the first read it attempted
+        is explained, and methods that start by writing are skipped without
+        touching anything.
+        """
+        attempted = []
+
+        def refuse(execute, sql, params, many, context):
+            if sql.startswith(TRANSACTION_STATEMENTS) or reads and sql.startswith('SELECT'):
+                return execute(sql, params, many, context)
+            attempted.append((sql, params))
+            raise QueryRefused
+
+        result = None
+        try:
+            with transaction.atomic(), connection.execute_wrapper(refuse):
+                result = build()
+        except QueryRefused:
+            pass
+        except Exception as exc:
+            return label, f'{type(exc).__name__}: {exc}'
+        if isinstance(result, models.QuerySet):
+            sql, params = result.query.sql_with_params()
+            return label, Target(label, sql, params, result.query)
+        if not attempted:
+            return label, 'no query'
+        sql, params = attempted[0]
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return label, 'writes'
+        return label, Target(label, sql, params)
+
+    # Plans
+
+    def explain(self, target):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {target.sql}', target.params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def findings(self, target, plan):
+        """
+        [(message, model, proposal, fixable)] for the problems in one plan; see
+        `proposal`. Full scans of unfiltered queries aren't fixable by an index.
+        """
+        predicates = {}
+        aliases = {}
+        if target.query is not None:
+            self.collect(target.query, predicates, aliases)
+        base = target.query.base_table if target.query is not None else None
+        findings = []
+        for line in plan:
+            if match := SCAN.match(line):
+                alias, index = match.groups()
+                if alias not in aliases and alias not in self.tables:
+                    continue
+                if index and predicates.get(alias, {}).get('order') and not any(map(TEMP_SORT.match, plan)):
+                    continue  # walking an index in the requested order, stopped by LIMIT
+                message = f'full scan of {alias}' + (f' via {index}' if index else '')
+                fixable = any(predicates.get(alias, {}).values())
+                if not fixable:
+                    message += ' (unfiltered)'
+                findings.append((message, *self.proposal(alias, aliases, predicates), fixable))
+            elif match := SEARCH.match(line):
+                alias, index, constraint = match.groups()
+                found = predicates.get(alias, {})
+                used = CONSTRAINED_COLUMN.findall(constraint)
+                covered = used + self.condition_columns(alias, aliases, index)
+                wanted = [column for column in [*found.get('eq', []), *found.get('flags', {})] if column not in covered]
+                if used and wanted:
+                    findings.append((f'{alias} index {index or "rowid"} leaves {", ".join(wanted)} '
+                                     f'to a row-by-row filter', *self.proposal(alias, aliases, predicates, leading=used),
+                                     True))
+            elif (match := TEMP_SORT.match(line)) and base is not None:
+                findings.append((f'temp B-tree for {match.group(1)}',
+                                 *self.proposal(base, aliases, predicates, sort=True), True))
+        return findings
+
+    def collect(self, query, predicates, aliases):
+        """Filtered and ordered columns per alias in `query` and its subqueries, and each alias's table."""
+        for alias, join in query.alias_map.items():
+            aliases[alias] = join.table_name
+        predicates.setdefault(query.base_table, {})['order'] = self.order_columns(query)
+        self.collect_where(query.where, predicates, aliases, indexable=True)
+
+    def collect_where(self, node, predicates, aliases, indexable):
+        indexable = indexable and not node.negated and node.connector == 'AND'
+        for child in node.children:
+            if hasattr(child, 'children'):
+                self.collect_where(child, predicates, aliases, indexable)
+                continue
+            rhs = getattr(child, 'rhs', None)
+            if isinstance(getattr(rhs, 'query', rhs), Query):
+                self.collect(getattr(rhs, 'query', rhs), predicates, aliases)
+            lhs = getattr(child, 'lhs', None)
+            if not indexable or not isinstance(lhs, Col):
+                continue
+            found = predicates.setdefault(lhs.alias, {})
+            column = lhs.target.column
+            if isinstance(lhs.target, models.BooleanField) and child.lookup_name == 'exact':
+                # SQLite gets `NOT col` / `col`, which no index can search on;
+                # only a partial index with the same condition helps.
+                found.setdefault('flags', {})[column] = bool(rhs)
+            elif child.lookup_name in EQUALITY_LOOKUPS + RANGE_LOOKUPS:
+                columns = found.setdefault('eq' if child.lookup_name in EQUALITY_LOOKUPS else 'range', [])
+                if column not in columns:
+                    columns.append(column)
+
+    def order_columns(self, query):
+        ordering = query.order_by or (query.get_meta().ordering if query.default_ordering else ())
+        columns = []
+        for name in ordering:
+            if not isinstance(name, str) or '__' in name or name.lstrip('-') == '?':
+                continue
+            name = name.lstrip('-')
+            columns.append(query.get_meta().pk.column if name == 'pk' else query.get_meta().get_field(name).column)
+        return columns
+
+    def condition_columns(self, alias, aliases, index_name):
+        """Columns a partial index's condition already restricts; they need no row filter."""
+        model = self.tables.get(aliases.get(alias, alias))
+        for index in model._meta.indexes if model is not None else ():
+            if index.name == index_name and index.condition is not None:
+                return [model._meta.get_field(name).column for name, _ in self.condition(index)]
+        return []
+
+    def proposal(self, alias, aliases, predicates, sort=False, leading=()):
+        """
+        (model, (fields, condition)) for an index that would serve the filters
+        on `alias`, where condition is a tuple of (boolean field, value) pairs
+        for a partial index, or (model, None) when no index would help or one
+        already exists.
+        """
+        model = self.tables.get(aliases.get(alias, alias))
+        if model is None or model._meta.auto_created:
+            return model, None
+        found = predicates.get(alias, {})
+        by_column = {field.column: field for field in model._meta.concrete_fields}
+        columns = [column for column in [*leading, *found.get('eq', [])]
+                   if column != model._meta.pk.column and not isinstance(by_column[column], models.BooleanField)]
+        columns = list(dict.fromkeys(columns))
+        trailing = found.get('order', []) if sort else found.get('range', [])[:1]
+        columns += [column for column in trailing if column not in columns]
+        if not columns or sort and not found.get('order'):
+            return model, None
+        fields = tuple(by_column[column].name for column in columns)
+        condition = tuple(sorted((by_column[column].name, value) for column, value in found.get('flags', {}).items()))
+        for existing, existing_condition in self.existing_indexes(model):
+            if existing[:len(fields)] == fields and existing_condition == condition:
+                return model, None
+        return model, (fields, condition)
+
+    def existing_indexes(self, model):
+        indexes = [(tuple(name.lstrip('-') for name in index.fields), self.condition(index))
+                   for index in model._meta.indexes]
+        indexes += [(tuple(fields), ()) for fields in model._meta.unique_together]
+        indexes += [((field.name,), ()) for field in model._meta.concrete_fields
+                    if field.db_index or field.unique or field.primary_key]
+        return [(fields, condition) for fields, condition in indexes if condition is not None]
+
+    @staticmethod
+    def condition(index):
+        """An index's condition as sorted (field, value) pairs; None if it is not a plain AND of lookups."""
+        if index.condition is None:
+            return ()
+        q = index.condition
+        if q.negated or q.connector != 'AND' or not all(isinstance(child, tuple) for child in q.children):
+            return None
+        return tuple(sorted(q.children))
+
+    # Proposals
+
+    def propose(self, proposals):
+        for (model, fields, condition) in list(proposals):
+            # Drop proposals another one already covers as a prefix.
+            if any(other is model and other_condition == condition and len(longer) > len(fields)
+                   and longer[:len(fields)] == fields for other, longer, other_condition in proposals):
+                del proposals[model, fields, condition]
+        if not proposals:
+            return
+        self.stdout.write('\nProposed indexes (add to Meta.indexes, then run `manage.py makemigrations`):')
+        by_app = {}
+        for (model, fields, condition), labels in proposals.items():
+            source = self.index_source(model, fields, condition)
+            by_app.setdefault(model._meta.app_label, []).append((model, source))
+            self.stdout.write(f'  {model._meta.label}: {source}')
+            self.stdout.write(f'      for {", ".join(sorted(set(labels)))}')
+        leaves = dict(MigrationLoader(connection, ignore_no_migrations=True).graph.leaf_nodes())
+        for app_label, indexes in by_app.items():
+            self.stdout.write(f'\n# {app_label}/migrations/XXXX_query_plan_indexes.py')
+            self.stdout.write('from django.db import migrations, models\n\n')
+            self.stdout.write('class Migration(migrations.Migration):')
+            self.stdout.write(f'    dependencies = [({app_label!r}, {leaves.get(app_label)!r})]\n')
+            self.stdout.write('    operations = [')
+            for model, source in indexes:
+                self.stdout.write('        migrations.AddIndex(')
+                self.stdout.write(f'            model_name={model._meta.model_name!r},')
+                self.stdout.write(f'            index={source},')
+                self.stdout.write('        ),')
+            self.stdout.write('    ]')
+
+    def index_source(self, model, fields, condition):
+        name = '_'.join([model._meta.model_name, *[name if value else f'not_{name}' for name, value in condition],
+                         *fields, 'idx'])
+        if len(name) > models.Index.max_name_length:
+            index = models.Index(fields=list(fields))
+            index.set_name_with_model(model)
+            name = index.name
+        source = f'models.Index(fields={list(fields)!r}, '
+        if condition:
+            source += f'condition=models.Q({", ".join(f"{field}={value!r}" for field, value in condition)}), '
+        return source + f'name={name!r})'
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.imaging import record_metadata
+from posts.models import PostMedia
+
+
+class Command(BaseCommand):
+    help = 'Compute size, dimensions, dominant colour and placeholder for PostMedia that lacks them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute metadata for every media item.')
+
+    def handle(self, *args, **options):
+        media = PostMedia.objects.order_by('pk')
+        if not options['all']:
+            media = media.filter(byte_size__isnull=True)
+        done = failed = 0
+        for item in media.iterator(chunk_size=500):
+            try:
+                record_metadata(item)
+                done += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f'PostMedia {item.pk} ({item.file.name}): {exc}')
+        self.stdout.write(f'Recorded metadata for {done} media, {failed} failed.')
@@ -0,0 +1,100 @@
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from pixessa.bench import measure
+from posts.search import CREATE_SQL, FTS_TABLE, POPULATE_SQL, fts_query
+
+SCHEMA = [
+    'CREATE TABLE accounts_user (id INTEGER PRIMARY KEY, is_private BOOL NOT NULL)',
+    'CREATE TABLE posts_post (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, caption TEXT NOT NULL, '
+    'location VARCHAR(100) NOT NULL, created_at DATETIME NOT NULL)',
+    'CREATE INDEX posts_post_user_id ON posts_post (user_id)',
+    'CREATE TABLE posts_tag (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE)',
+    'CREATE TABLE posts_post_tags (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, tag_id INTEGER NOT NULL)',
+    'CREATE INDEX posts_post_tags_post_id ON posts_post_tags (post_id)',
+]
+
+# What PostManager.public_posts() + icontains compiles to on SQLite.
+ICONTAINS_SQL = """
+    SELECT p.id FROM posts_post p JOIN accounts_user u ON u.id = p.user_id
+    WHERE NOT u.is_private AND {conditions}
+    ORDER BY p.created_at DESC LIMIT 20
+"""
+ICONTAINS_CONDITION = "(p.caption LIKE ? ESCAPE '\\' OR p.location LIKE ? ESCAPE '\\')"
+
+FTS_SQL = f"""
+    SELECT p.id FROM posts_post p JOIN accounts_user u ON u.id = p.user_id, {FTS_TABLE}
+    WHERE NOT u.is_private AND {FTS_TABLE}.rowid = p.id AND {FTS_TABLE} MATCH ?
+    ORDER BY {FTS_TABLE}.rank, p.id DESC LIMIT 20
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare FTS5 search latency with icontains scans on a throwaway SQLite database '
+        'filled with synthetic posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2_000_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--number', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        vocabulary = [f'w{i:05d}' for i in range(options['vocabulary'])]
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db = sqlite3.connect(os.path.join(tmp, 'bench.sqlite3'))
+            db.execute('PRAGMA journal_mode = OFF')
+            db.execute('PRAGMA synchronous = OFF')
+            for statement in SCHEMA:
+                db.execute(statement)
+
+            start = time.perf_counter()
+            db.executemany('INSERT INTO accounts_user VALUES (?, ?)', (
+                (i, rng.random() < 0.3) for i in range(1, options['users'] + 1)
+            ))
+            db.executemany('INSERT INTO posts_post VALUES (?, ?, ?, ?, ?)', (
+                (
+                    i,
+                    rng.randint(1, options['users']),
+                    ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(5, 20))),
+                    rng.choice(vocabulary[:500]),
+                    f'2025-01-01 00:00:{i:012d}',
+                )
+                for i in range(1, options['posts'] + 1)
+            ))
+            db.commit()
+            self.stdout.write(f'Loaded {options["posts"]:,} posts in {time.perf_counter() - start:.1f}s')
+
+            # Same path as the migration: create the index and triggers, then populate in one statement.
+            start = time.perf_counter()
+            for statement in CREATE_SQL + [POPULATE_SQL]:
+                db.execute(statement)
+            db.commit()
+            self.stdout.write(f'Built the FTS5 index in {time.perf_counter() - start:.1f}s')
+
+            queries = {
+                'common word': [vocabulary[1]],
+                'mid-frequency word': [vocabulary[200]],
+                'rare word': [vocabulary[-1]],
+                'two words': [vocabulary[3], vocabulary[40]],
+            }
+            self.stdout.write(f'{"query":<22}{"icontains ms":>14}{"fts5 ms":>10}')
+            for label, words in queries.items():
+                like_args = [arg for word in words for arg in (f'%{word}%', f'%{word}%')]
+                like_sql = ICONTAINS_SQL.format(conditions=' AND '.join([ICONTAINS_CONDITION] * len(words)))
+                scan, _ = measure(lambda: db.execute(like_sql, like_args).fetchall(), number=options['number'])
+                match = fts_query(' '.join(words))
+                fts, _ = measure(lambda: db.execute(FTS_SQL, [match]).fetchall(), number=options['number'])
+                self.stdout.write(f'{label:<22}{scan:>14.2f}{fts:>10.2f}')
+            db.close()
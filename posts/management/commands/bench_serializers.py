@@ -0,0 +1,103 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from likes.models import Like
+from pixessa.bench import measure, scratch_data
+from pixessa.renderers import FastJSONRenderer, orjson
+from pixessa.serializers import CompiledListSerializer
+from posts.api import PostSerializer, page_counts, viewer_flags
+from posts.models import Comment, Post, PostMedia, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare DRF serialization of a page of posts with the compiled read path, and the stock '
+        'JSON renderer with FastJSONRenderer. Seeds synthetic data inside a rolled-back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100)
+        parser.add_argument('--number', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with scratch_data():
+            viewer = self.seed(options['posts'])
+            request = RequestFactory(HTTP_HOST='localhost').get('/api/posts/feed/')
+            request.user = viewer
+            posts = list(
+                Post.objects.filter(user__username__startswith='bench-ser-')
+                .select_related('user').prefetch_related('media', 'tags').order_by('-created_at')
+            )
+
+            def before():
+                # Today's path: per-post count queries and DRF field machinery.
+                context = {'request': request, 'viewer_flags': viewer_flags(viewer, posts)}
+                return PostSerializer(posts, many=True, context=context).data
+
+            def context():
+                return {'request': request, 'viewer_flags': viewer_flags(viewer, posts), **page_counts(posts)}
+
+            def after():
+                return CompiledListSerializer(PostSerializer, posts, context()).data
+
+            fixed = context()
+            drf_data = PostSerializer(posts, many=True, context=fixed).data
+            compiled_data = CompiledListSerializer(PostSerializer, posts, fixed).data
+            if json.loads(JSONRenderer().render(drf_data)) != compiled_data:
+                raise CommandError('Compiled output differs from PostSerializer')
+            if FastJSONRenderer().render(compiled_data) != JSONRenderer().render(drf_data):
+                raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+
+            cases = [
+                ('DRF, per-post counts', before),
+                ('DRF, page counts', lambda: PostSerializer(posts, many=True, context=context()).data),
+                ('compiled, page counts', after),
+                ('DRF fields only', lambda: PostSerializer(posts, many=True, context=fixed).data),
+                ('compiled fields only', lambda: CompiledListSerializer(PostSerializer, posts, fixed).data),
+                ('JSONRenderer', lambda: JSONRenderer().render(drf_data)),
+                ('FastJSONRenderer', lambda: FastJSONRenderer().render(compiled_data)),
+            ]
+            self.stdout.write(f'{len(posts)} posts; orjson {"available" if orjson else "not installed"}')
+            self.stdout.write(f'{"case":<26}{"best ms":>10}{"median ms":>12}')
+            for label, fn in cases:
+                best, median = measure(fn, number=options['number'])
+                self.stdout.write(f'{label:<26}{best:>10.3f}{median:>12.3f}')
+
+    def seed(self, count):
+        users = User.objects.bulk_create([
+            User(username=f'bench-ser-{i}', email=f'bench-ser-{i}@example.com', bio=f'bio {i}', is_private=False)
+            for i in range(20)
+        ])
+        viewer = users[0]
+        viewer.following.add(*users[1:10])
+        tags = Tag.objects.bulk_create([Tag(name=f'bench-ser-{i}') for i in range(10)])
+        posts = Post.objects.bulk_create([
+            Post(user=users[i % len(users)], caption=f'caption {i} ✨', location='Istanbul')
+            for i in range(count)
+        ])
+        PostMedia.objects.bulk_create([
+            PostMedia(
+                post=post, file=f'post_media/bench-{post.pk}-{n}.jpg', media_type='image', order=n,
+                width=1080, height=1350, byte_size=250_000, dominant_color='#336699',
+                variants={'thumb': {'name': f'post_media/bench-{post.pk}-{n}-thumb.webp', 'width': 320,
+                                    'height': 400}},
+            )
+            for post in posts for n in range(2)
+        ])
+        Post.tags.through.objects.bulk_create([
+            Post.tags.through(post=post, tag=tags[(post.pk + n) % len(tags)]) for post in posts for n in range(3)
+        ])
+        post_type = ContentType.objects.get_for_model(Post)
+        Like.objects.bulk_create([
+            Like(user=user, content_type=post_type, object_id=post.pk)
+            for post in posts for user in users[:post.pk % 5]
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=post, user=users[n], content=f'comment {n}') for post in posts for n in range(post.pk % 4)
+        ])
+        return viewer
@@ -0,0 +1,159 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from pixessa.bench import measure
+
+SCHEMA = [
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, comments_count INTEGER NOT NULL)',
+    'CREATE TABLE bench_comment (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, content TEXT NOT NULL)',
+    'CREATE INDEX bench_comment_post_id ON bench_comment (post_id)',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent comment-style write transactions (read the post, insert a row, bump a counter) '
+        'against throwaway SQLite files with the default settings and with SQLITE_PRODUCTION_OPTIONS, '
+        'and report throughput, latency and "database is locked" failures.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--transactions', type=int, default=200, help='Per writer.')
+        parser.add_argument('--posts', type=int, default=100)
+
+    def handle(self, *args, **options):
+        profiles = [
+            ('default', {}),
+            ('production', settings.SQLITE_PRODUCTION_OPTIONS),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(
+                f'{options["writers"]} writers x {options["transactions"]} transactions, {options["readers"]} readers'
+            )
+            self.stdout.write(
+                f'{"profile":<12}{"ok":>8}{"locked":>8}{"tx/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"reads":>10}'
+            )
+            for name, db_options in profiles:
+                alias = f'bench_{name}'
+                self.add_database(alias, os.path.join(tmp, f'{name}.sqlite3'), db_options)
+                try:
+                    self.seed(alias, options['posts'])
+                    ok, locked, elapsed, latencies, reads = self.run(alias, options)
+                    self.stdout.write(
+                        f'{name:<12}{ok:>8}{locked:>8}{ok / elapsed:>10.0f}'
+                        f'{statistics.median(latencies):>10.2f}{self.percentile(latencies, 99):>10.2f}{reads:>10}'
+                    )
+                    self.report_connection_cost(alias)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+    def add_database(self, alias, path, db_options):
+        configured = connections.configure_settings({
+            **connections.settings,
+            alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': db_options},
+        })
+        connections.settings[alias] = configured[alias]
+
+    def seed(self, alias, posts):
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany('INSERT INTO bench_post (id, comments_count) VALUES (%s, 0)', [
+                (i,) for i in range(1, posts + 1)
+            ])
+
+    def run(self, alias, options):
+        results = {'ok': 0, 'locked': 0, 'reads': 0, 'latencies': []}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            latencies, ok, locked = [], 0, 0
+            try:
+                for i in range(options['transactions']):
+                    post_id = rng.randint(1, options['posts'])
+                    start = time.perf_counter()
+                    try:
+                        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT comments_count FROM bench_post WHERE id = %s', [post_id])
+                            cursor.fetchone()
+                            cursor.execute(
+                                'INSERT INTO bench_comment (post_id, content) VALUES (%s, %s)', [post_id, f'c{i}'],
+                            )
+                            cursor.execute(
+                                'UPDATE bench_post SET comments_count = comments_count + 1 WHERE id = %s', [post_id],
+                            )
+                    except OperationalError:
+                        locked += 1
+                    else:
+                        ok += 1
+                        latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections[alias].close()
+            with lock:
+                results['ok'] += ok
+                results['locked'] += locked
+                results['latencies'] += latencies
+
+        def reader(seed):
+            rng = random.Random(seed)
+            reads = 0
+            try:
+                while not done.is_set():
+                    try:
+                        post_id = rng.randint(1, options['posts'])
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*) FROM bench_comment WHERE post_id = %s', [post_id])
+                            cursor.fetchone()
+                        reads += 1
+                    except OperationalError:
+                        pass
+            finally:
+                connections[alias].close()
+            with lock:
+                results['reads'] += reads
+
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        readers = [threading.Thread(target=reader, args=(-i,)) for i in range(1, options['readers'] + 1)]
+        start = time.perf_counter()
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        for thread in readers:
+            thread.join()
+        return results['ok'], results['locked'], elapsed, results['latencies'] or [0], results['reads']
+
+    def report_connection_cost(self, alias):
+        # What CONN_MAX_AGE saves: opening (and configuring) a connection for each request.
+        def reconnect():
+            connections[alias].close()
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        def reuse():
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        fresh, _ = measure(reconnect, number=200)
+        kept, _ = measure(reuse, number=200)
+        self.stdout.write(f'{"":<12}connection per request {fresh:.3f} ms, persistent {kept:.3f} ms')
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
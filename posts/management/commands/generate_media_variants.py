@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.imaging import generate_variants
+from posts.models import PostMedia
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail/feed/full derivatives for image PostMedia that has none.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate variants for every image.')
+
+    def handle(self, *args, **options):
+        media = PostMedia.objects.filter(media_type='image').order_by('pk')
+        if not options['all']:
+            media = media.filter(variants={})
+        done = failed = 0
+        for item in media.iterator(chunk_size=500):
+            try:
+                generate_variants(item)
+                done += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f'PostMedia {item.pk} ({item.file.name}): {exc}')
+        self.stdout.write(f'Generated variants for {done} media, {failed} failed.')
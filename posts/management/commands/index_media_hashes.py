@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.imaging import record_metadata
+from posts.models import PostMedia
+from posts.similarity import HashIndex
+
+
+class Command(BaseCommand):
+    help = 'Compute perceptual hashes for images that lack them and optionally report near-duplicate groups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', action='store_true', help='List groups of near-duplicate media.')
+        parser.add_argument('--radius', type=int, default=settings.MEDIA_HASH_RADIUS)
+
+    def handle(self, *args, **options):
+        hashed = failed = 0
+        missing = PostMedia.objects.filter(media_type='image', phash='').order_by('pk')
+        for media in missing.iterator(chunk_size=500):
+            try:
+                record_metadata(media)
+                hashed += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f'PostMedia {media.pk} ({media.file.name}): {exc}')
+        self.stdout.write(f'Hashed {hashed} images, {failed} failed.')
+        if not options['report']:
+            return
+
+        start = time.perf_counter()
+        index = HashIndex.load()
+        self.stdout.write(f'Indexed {len(index)} hashes in {time.perf_counter() - start:.2f}s')
+        start = time.perf_counter()
+        seen = set()
+        groups = 0
+        for media_id, value in zip(index.ids.tolist(), index.hashes.tolist()):
+            if media_id in seen:
+                continue
+            matches = index.query(value, options['radius'], exclude=media_id)
+            if matches:
+                groups += 1
+                seen.update(match_id for match_id, _ in matches)
+                listed = ', '.join(f'{match_id} (d={distance})' for match_id, distance in matches)
+                self.stdout.write(f'{media_id}: {listed}')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{groups} near-duplicate groups; {elapsed * 1000 / max(len(index), 1):.3f} ms per query'
+        )
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.explore import refresh_explore
+
+
+class Command(BaseCommand):
+    help = (
+        'Score recent public posts for the explore feed. Incremental unless --full is given or the '
+        'last full run is older than EXPLORE_FULL_REFRESH_SECONDS; run it every few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Rescore every post in the window and drop stale entries.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPLORE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        scored, removed = refresh_explore(full=options['full'], chunk_size=options['chunk_size'])
+        self.stdout.write(f'Scored {scored} posts, removed {removed} stale entries.')
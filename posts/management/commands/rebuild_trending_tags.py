@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.models import Post
+from posts.trending import TrendingTags
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the trending tags snapshot by replaying recent tag usage from the database. '
+        'Running workers adopt it, plus their own unsaved counts, on their next save.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3)
+
+    def handle(self, *args, **options):
+        path = settings.TRENDING_TAGS_SNAPSHOT_PATH
+        if not path:
+            raise CommandError('TRENDING_TAGS_SNAPSHOT_PATH is not set.')
+        since = timezone.now() - timedelta(days=options['days'])
+        rows = (
+            Post.tags.through.objects
+            .filter(post__created_at__gte=since)
+            .order_by('post__created_at')
+            .values_list('tag_id', 'post__created_at')
+        )
+        engine = TrendingTags()
+        used = 0
+        for tag_id, created_at in rows.iterator(chunk_size=10000):
+            engine.record([tag_id], created_at.timestamp())
+            used += 1
+        engine.save(path, merge=False)
+        self.stdout.write(f'Replayed {used} tag uses since {since:%Y-%m-%d %H:%M}; wrote {path}.')
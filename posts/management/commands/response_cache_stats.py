@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+import accounts.api  # noqa: F401 -- registers the cached endpoints
+import posts.api  # noqa: F401
+from pixessa.cache import hit_rates, reset_hit_rates
+
+
+class Command(BaseCommand):
+    help = (
+        'Report hit rates of the versioned response cache per endpoint. Workers add their counts '
+        'to the database every RESPONSE_CACHE_STATS_INTERVAL seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after reporting.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"endpoint":<16}{"hits":>10}{"misses":>10}{"hit rate":>10}')
+        for endpoint, (hits, misses) in hit_rates().items():
+            rate = f'{hits / (hits + misses):.1%}' if hits + misses else '-'
+            self.stdout.write(f'{endpoint:<16}{hits:>10}{misses:>10}{rate:>10}')
+        if options['reset']:
+            reset_hit_rates()
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:52
+
+from django.db import migrations
+
+# The SQL is spelled out here rather than imported from posts.search, so that
+# later edits to that module can't change what this migration does.
+#
+# SQLite can't alter most columns in place, so Django rebuilds the table for
+# such changes and the rebuild drops these triggers with the old table. A
+# future migration that alters posts_post, posts_post_tags or posts_tag that
+# way must recreate them afterwards.
+
+TAGS_OF = (
+    "(SELECT coalesce(group_concat(t.name, ' '), '') FROM posts_post_tags pt "
+    "JOIN posts_tag t ON t.id = pt.tag_id WHERE pt.post_id = %s)"
+)
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        caption, location, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    "INSERT INTO posts_post_fts(posts_post_fts, rank) VALUES ('rank', 'bm25(1.0, 0.5, 2.0)')",
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, caption, location, tags)
+        VALUES (new.id, new.caption, new.location, '');
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF caption, location ON posts_post BEGIN
+        UPDATE posts_post_fts SET caption = new.caption, location = new.location WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_tags_fts_insert AFTER INSERT ON posts_post_tags BEGIN
+        UPDATE posts_post_fts SET tags = %s WHERE rowid = new.post_id;
+    END
+    """ % (TAGS_OF % 'new.post_id'),
+    """
+    CREATE TRIGGER posts_post_tags_fts_delete AFTER DELETE ON posts_post_tags BEGIN
+        UPDATE posts_post_fts SET tags = %s WHERE rowid = old.post_id;
+    END
+    """ % (TAGS_OF % 'old.post_id'),
+    """
+    CREATE TRIGGER posts_tag_fts_update AFTER UPDATE OF name ON posts_tag BEGIN
+        UPDATE posts_post_fts SET tags = %s
+        WHERE rowid IN (SELECT post_id FROM posts_post_tags WHERE tag_id = new.id);
+    END
+    """ % (TAGS_OF % 'posts_post_fts.rowid'),
+    """
+    INSERT INTO posts_post_fts(rowid, caption, location, tags)
+    SELECT p.id, p.caption, p.location, %s FROM posts_post p
+    """ % (TAGS_OF % 'p.id'),
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS posts_tag_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_tags_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_tags_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_comment_hate_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:00
+
+import mediastore.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_postmedia_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postmedia',
+            name='file',
+            field=models.FileField(storage=mediastore.storage.get_media_storage, upload_to='post_media/'),
+        ),
+    ]
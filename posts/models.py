@@ -1,8 +1,14 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
+from django.utils import timezone
 
 from likes.models import Like
+from mediastore.storage import get_media_storage
 
 User = get_user_model()
 
@@ -60,6 +66,11 @@ class Post(models.Model):
 
     objects = PostManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='post_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Post by {self.user} at {self.created_at}"
 
@@ -70,18 +81,58 @@ class PostMedia(models.Model):
     ]
 
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media')
-    file = models.FileField(upload_to='post_media/')
+    file = models.FileField(upload_to='post_media/', storage=get_media_storage)
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPES)
     order = models.PositiveIntegerField(default=0)
+    # Derivative name -> {'name': storage path, 'width', 'height'}; filled in by posts.imaging.
+    variants = models.JSONField(default=dict, blank=True)
+    # Filled in after upload so clients can lay out and preview media before fetching it.
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    byte_size = models.PositiveBigIntegerField(null=True, blank=True)
+    dominant_color = models.CharField(max_length=7, blank=True)
+    placeholder = models.CharField(max_length=64, blank=True)  # BlurHash
+    # 64-bit perceptual hashes as hex, for near-duplicate detection (posts.similarity).
+    dhash = models.CharField(max_length=16, blank=True)
+    phash = models.CharField(max_length=16, blank=True, db_index=True)
+    # Closest earlier media within MEDIA_HASH_RADIUS, found when this one was processed.
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['post', 'order'], name='postmedia_post_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.media_type} for post {self.post.id}"
 
 
+class UploadSession(models.Model):
+    """A resumable upload of one PostMedia file; see posts.uploads."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    media_type = models.CharField(max_length=5, choices=PostMedia.MEDIA_TYPES)
+    order = models.PositiveIntegerField(default=0)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_DIR, f'{self.id}.part')
+
+    def __str__(self):
+        return f"Upload {self.id}: {self.offset}/{self.size} bytes of {self.filename}"
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -94,5 +145,44 @@ class Comment(models.Model):
 
     objects = CommentManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post'], condition=models.Q(is_offensive=False), name='comment_visible_post_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user} on {self.post}"
+
+
+class ExploreEntryManager(models.Manager):
+    def ranked(self, after=None):
+        """
+        Entries in rank order, starting after the (score, post_id) of the last
+        entry of the previous page so deep pages cost the same as the first.
+        """
+        entries = self.filter(post__user__is_private=False).order_by('-score', '-post_id')
+        if after is not None:
+            score, post_id = after
+            entries = entries.filter(
+                models.Q(score__lt=score) | models.Q(score=score, post_id__lt=post_id)
+            )
+        return entries.select_related('post__user')
+
+
+class ExploreEntry(models.Model):
+    """Precomputed explore rank of a recent public post, written by `manage.py rank_explore`."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='explore_entry')
+    # Denormalised author, so blocked users can be filtered without joining posts.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    objects = ExploreEntryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-post'], name='explore_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} scored {self.score:.3f}"
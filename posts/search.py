@@ -0,0 +1,123 @@
+"""
+Full-text search over post captions, locations and tag names.
+
+On SQLite the posts are mirrored into an FTS5 table, `posts_post_fts`,
+whose rowid is the post id. Triggers on posts_post, posts_post_tags and
+posts_tag keep it in sync with every write, including bulk ORM operations
+that bypass model signals. Other database backends fall back to icontains
+filtering.
+
+Migration 0004_post_search creates the same table and triggers from its own
+copy of this SQL. A migration that makes SQLite rebuild one of those tables
+(most AlterField operations do) drops the triggers and must recreate them.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from blocks.cache import exclude_blocked
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+# Aggregated tag names of the post whose id is bound to :post_id.
+_TAGS_OF = (
+    "(SELECT coalesce(group_concat(t.name, ' '), '') FROM posts_post_tags pt "
+    "JOIN posts_tag t ON t.id = pt.tag_id WHERE pt.post_id = {post_id})"
+)
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        caption, location, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    # Rank with bm25, weighting tags highest and locations lowest.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(1.0, 0.5, 2.0)')",
+    f"""
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, caption, location, tags)
+        VALUES (new.id, new.caption, new.location, '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF caption, location ON posts_post BEGIN
+        UPDATE {FTS_TABLE} SET caption = new.caption, location = new.location WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER posts_post_tags_fts_insert AFTER INSERT ON posts_post_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_OF.format(post_id='new.post_id')} WHERE rowid = new.post_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER posts_post_tags_fts_delete AFTER DELETE ON posts_post_tags BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_OF.format(post_id='old.post_id')} WHERE rowid = old.post_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER posts_tag_fts_update AFTER UPDATE OF name ON posts_tag BEGIN
+        UPDATE {FTS_TABLE} SET tags = {_TAGS_OF.format(post_id=f'{FTS_TABLE}.rowid')}
+        WHERE rowid IN (SELECT post_id FROM posts_post_tags WHERE tag_id = new.id);
+    END
+    """,
+]
+
+POPULATE_SQL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, caption, location, tags)
+    SELECT p.id, p.caption, p.location, {_TAGS_OF.format(post_id='p.id')} FROM posts_post p
+"""
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS posts_tag_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_tags_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_tags_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def fts_query(text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the
+    last one may be a prefix so results update while typing.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_posts(text, viewer=None):
+    """Public posts matching `text`, best match first."""
+    posts = exclude_blocked(Post.objects.public_posts(), viewer)
+    if connection.vendor != 'sqlite':
+        words = re.findall(r'\w+', text)
+        for word in words:
+            posts = posts.filter(
+                Q(caption__icontains=word) | Q(location__icontains=word) | Q(tags__name__icontains=word)
+            )
+        return posts.distinct().order_by('-created_at') if words else posts.none()
+
+    query = fts_query(text)
+    if not query:
+        return posts.none()
+    return posts.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = posts_post.id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+        select={'rank': f'{FTS_TABLE}.rank'},
+        order_by=['rank', '-id'],
+    )
@@ -0,0 +1,69 @@
+from functools import partial
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from likes.models import Like
+from pixessa.cache import bump
+from .imaging import delete_variant_files
+from .models import Comment, Post, PostMedia
+from .trending import record_tags
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # tag.posts.add(...): one tag used by each of the added posts.
+        tag_ids = [instance.pk] * len(pk_set)
+    else:
+        tag_ids = list(pk_set)
+    transaction.on_commit(partial(record_tags, tag_ids))
+
+
+@receiver(post_delete, sender=PostMedia)
+def delete_media_variants(sender, instance, **kwargs):
+    if instance.variants:
+        transaction.on_commit(partial(delete_variant_files, instance.file.storage, instance.variants))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, created=True, **kwargs):
+    bump('post', instance.pk)
+    bump('user', instance.user_id)  # posts_count
+    if created:
+        # Post lists fold this into Last-Modified; edits show up through ('post', pk).
+        bump('posts', 'list')
+
+
+@receiver(post_save, sender=PostMedia)
+@receiver(post_delete, sender=PostMedia)
+def invalidate_media_post(sender, instance, **kwargs):
+    bump('post', instance.post_id)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump('post', instance.pk)
+    elif pk_set:
+        bump('post', *pk_set)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    bump('comments', instance.post_id)
+    bump('post', instance.post_id)  # comments_count
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_liked(sender, instance, **kwargs):
+    bump(ContentType.objects.get_for_id(instance.content_type_id).model, instance.object_id)
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+from scipy.fft import dctn
+
+
+def dhash(image):
+    """64-bit difference hash: whether each pixel of a 9x8 greyscale thumbnail is brighter than its right neighbour."""
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image):
+    """64-bit DCT hash: low-frequency coefficients of a 32x32 thumbnail compared with their median."""
+    pixels = np.asarray(image.convert('L').resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = dctn(pixels, norm='ortho')[:8, :8]
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def _pack(bits):
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def to_hex(value):
+    return f'{value:016x}'
+
+
+class HashIndex:
+    """
+    Multi-index hash table over 64-bit perceptual hashes.
+
+    Hashes are split into `chunks` disjoint bit ranges, each with its own
+    sorted lookup table. Two hashes within Hamming distance `chunks - 1` must
+    agree exactly on at least one range (pigeonhole), so a query only checks
+    the entries sharing a range with it instead of the whole corpus.
+    """
+
+    def __init__(self, ids, hashes, chunks=None):
+        self.chunks = chunks or settings.MEDIA_HASH_RADIUS + 1
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        edges = np.linspace(0, 64, self.chunks + 1).astype(int)
+        self._ranges = list(zip(edges[:-1], edges[1:]))
+        self._tables = []
+        for start, stop in self._ranges:
+            keys = self._chunk(self.hashes, start, stop)
+            order = np.argsort(keys, kind='stable')
+            self._tables.append((keys[order], order))
+        self._pending_ids = []
+        self._pending_hashes = []
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chunk(hashes, start, stop):
+        return (hashes >> np.uint64(64 - stop)) & np.uint64((1 << (stop - start)) - 1)
+
+    @classmethod
+    def load(cls):
+        from .models import PostMedia
+
+        rows = PostMedia.objects.exclude(phash='').values_list('id', 'phash')
+        ids, hashes = [], []
+        for media_id, value in rows.iterator(chunk_size=10000):
+            ids.append(media_id)
+            hashes.append(int(value, 16))
+        return cls(ids, hashes)
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending_ids)
+
+    def add(self, media_id, value):
+        """Index a new hash; it is scanned linearly until the next rebuild."""
+        with self._lock:
+            self._pending_ids.append(media_id)
+            self._pending_hashes.append(value)
+
+    def query(self, value, radius=None, exclude=None):
+        """(media_id, distance) pairs within `radius` of `value`, closest first."""
+        radius = settings.MEDIA_HASH_RADIUS if radius is None else radius
+        target = np.uint64(value)
+        if radius < self.chunks:
+            positions = []
+            for (start, stop), (keys, order) in zip(self._ranges, self._tables):
+                key = self._chunk(target, start, stop)
+                lo, hi = np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+                positions.append(order[lo:hi])
+            # A candidate may turn up in several tables; duplicates are dropped after filtering.
+            positions = np.concatenate(positions)
+        else:
+            positions = np.arange(len(self.ids))
+        ids = self.ids[positions]
+        distances = np.bitwise_count(self.hashes[positions] ^ target)
+        with self._lock:
+            if self._pending_ids:
+                ids = np.concatenate((ids, np.asarray(self._pending_ids, dtype=np.int64)))
+                pending = np.asarray(self._pending_hashes, dtype=np.uint64)
+                distances = np.concatenate((distances, np.bitwise_count(pending ^ target)))
+        keep = distances <= radius
+        if exclude is not None:
+            keep &= ids != exclude
+        ids, first = np.unique(ids[keep], return_index=True)
+        distances = distances[keep][first]
+        order = np.lexsort((ids, distances))
+        return [(int(ids[i]), int(distances[i])) for i in order]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def media_hash_index():
+    """This process's index, rebuilt after MEDIA_HASH_INDEX_MAX_AGE seconds to pick up other workers' uploads."""
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.built_at > settings.MEDIA_HASH_INDEX_MAX_AGE:
+        with _index_lock:
+            if _index is index:
+                _index = HashIndex.load()
+            index = _index
+    return index
+
@@ -1,3 +1,162 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import User
+from likes.models import Like
+from pixessa.models import EntityVersion
+from pixessa.renderers import FastJSONRenderer
+from pixessa.serializers import CompiledListSerializer
+from .api import CommentSerializer, PostSerializer, page_counts, viewer_flags
+from .models import Comment, Post, PostMedia, Tag
+from .search import search_posts
+
+
+class CompiledPlanTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='x')
+        author = User.objects.create_user(email='author@example.com', username='author', password='x', bio='Ünïcode bio')
+        self.viewer.following.add(author)
+        post = Post.objects.create(user=author, caption='first', location='Ankara')
+        post.tags.add(Tag.objects.create(name='sunset'), Tag.objects.create(name='sea'))
+        with self.captureOnCommitCallbacks(execute=True):
+            PostMedia.objects.create(
+                post=post, media_type='image', width=4, height=3,
+                file=SimpleUploadedFile('a.jpg', b'bytes', content_type='image/jpeg'),
+                variants={'thumb': {'name': 'variants/a.webp', 'width': 2, 'height': 1}},
+            )
+        Post.objects.create(user=self.viewer, caption='')
+        comment = Comment.objects.create(post=post, user=self.viewer, content='nice')
+        Comment.objects.create(post=post, user=author, content='thanks', parent=comment)
+        self.request = APIRequestFactory().get('/', HTTP_HOST='testserver')
+        self.request.user = self.viewer
+
+    def assertSameOutput(self, serializer_class, instances, context):
+        expected = JSONRenderer().render(serializer_class(instances, many=True, context=context).data)
+        compiled = CompiledListSerializer(serializer_class, instances, context).data
+        self.assertEqual(FastJSONRenderer().render(compiled), expected)
+
+    def test_posts_match_drf(self):
+        posts = list(Post.objects.prefetch_related('media', 'tags').select_related('user'))
+        context = {'request': self.request, 'viewer_flags': viewer_flags(self.viewer, posts), **page_counts(posts)}
+        self.assertSameOutput(PostSerializer, posts, context)
+
+    def test_comments_match_drf(self):
+        comments = list(Comment.objects.prefetch_related('replies__user'))
+        self.assertSameOutput(CommentSerializer, comments, {'request': self.request})
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='x')
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='x')
+        self.older = Post.objects.create(user=self.author, caption='older')
+        self.newer = Post.objects.create(user=self.viewer, caption='newer')
+        # Push every stamp a minute into the past so Last-Modified can move within the test.
+        Post.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        EntityVersion.objects.update(version=F('version') - 60 * 10**9)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def assertRevalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 200)
+
+    def test_detail_changes_after_edit(self):
+        def edit():
+            self.older.caption = 'edited'
+            self.older.save()
+        self.assertRevalidates(f'/api/posts/{self.older.pk}/', edit)
+
+    def test_list_changes_after_deleting_older_post(self):
+        def delete():
+            # The author has nothing else in the list, so only the list version records the removal.
+            self.older.delete()
+        self.assertRevalidates('/api/posts/', delete)
+
+    def test_list_changes_after_like(self):
+        def like():
+            Like.objects.toggle_like(self.viewer, self.newer)
+        self.assertRevalidates('/api/posts/', like)
+
+
+class ViewerFlagsTests(TestCase):
+    def test_single_post_looks_flags_up_once(self):
+        viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='x')
+        author = User.objects.create_user(email='author@example.com', username='author', password='x')
+        viewer.following.add(author)
+        post = Post.objects.create(user=author, caption='hello')
+        Like.objects.toggle_like(viewer, post)
+        request = APIRequestFactory().get('/')
+        request.user = viewer
+        serializer = PostSerializer(post, context={'request': request})
+        with self.assertNumQueries(2):
+            flags = (serializer.get_is_liked(post), serializer.get_author_followed(post))
+        self.assertEqual(flags, (True, True))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'full-text search uses SQLite FTS5')
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author', password='x', is_private=False,
+        )
+        self.post = Post.objects.create(user=self.author, caption='Sunset at the café', location='Izmir')
+
+    def found(self, text):
+        return [post.pk for post in search_posts(text)]
+
+    def test_matches_caption_location_and_prefix(self):
+        self.assertEqual(self.found('sunset'), [self.post.pk])
+        self.assertEqual(self.found('cafe'), [self.post.pk])
+        self.assertEqual(self.found('izm'), [self.post.pk])
+        self.assertEqual(self.found('sunset izmir'), [self.post.pk])
+        self.assertEqual(self.found('sunrise'), [])
+        self.assertEqual(self.found('"; DROP TABLE'), [])
+
+    def test_edits_and_deletes_update_the_index(self):
+        self.post.caption = 'Morning swim'
+        self.post.save()
+        self.assertEqual(self.found('sunset'), [])
+        self.assertEqual(self.found('swim'), [self.post.pk])
+        Post.objects.filter(pk=self.post.pk).update(location='Bodrum')
+        self.assertEqual(self.found('bodrum'), [self.post.pk])
+        self.post.delete()
+        self.assertEqual(self.found('swim'), [])
+
+    def test_tags_are_indexed(self):
+        tag = Tag.objects.create(name='golden')
+        self.post.tags.add(tag)
+        self.assertEqual(self.found('golden'), [self.post.pk])
+        tag.name = 'amber'
+        tag.save()
+        self.assertEqual(self.found('golden'), [])
+        self.assertEqual(self.found('amber'), [self.post.pk])
+        self.post.tags.remove(tag)
+        self.assertEqual(self.found('amber'), [])
+
+    def test_tag_matches_rank_above_caption_matches(self):
+        tagged = Post.objects.create(user=self.author, caption='evening')
+        tagged.tags.add(Tag.objects.create(name='sunset'))
+        self.assertEqual(self.found('sunset'), [tagged.pk, self.post.pk])
+
+    def test_private_authors_are_hidden(self):
+        self.author.is_private = True
+        self.author.save()
+        self.assertEqual(self.found('sunset'), [])
@@ -0,0 +1,268 @@
+import atexit
+import heapq
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.core.files import locks
+
+# Multiply-shift hashing modulo a Mersenne prime; the fixed seeds keep row
+# positions stable across restarts so snapshots stay valid.
+_PRIME = (1 << 61) - 1
+_SEEDS = [(0x9E3779B97F4A7C15 + 2 * i + 1, 0x632BE59BD9B4E019 * (i + 1)) for i in range(16)]
+
+# Forward-decay weights grow as exp(age / tau); rescale before they overflow.
+_MAX_EXPONENT = 50.0
+
+
+class CountMinSketch:
+    """Approximate per-key totals in a fixed `depth` x `width` table of floats."""
+
+    def __init__(self, width, depth, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.float64)
+
+    def _columns(self, key):
+        return [((a * key + b) % _PRIME) % self.width for a, b in _SEEDS[:self.depth]]
+
+    def add(self, key, weight):
+        """Add `weight` to `key` and return its new estimate."""
+        rows = np.arange(self.depth)
+        cols = self._columns(key)
+        self.table[rows, cols] += weight
+        return float(self.table[rows, cols].min())
+
+    def estimate(self, key):
+        return float(self.table[np.arange(self.depth), self._columns(key)].min())
+
+
+class DecayedHeavyHitters:
+    """
+    Time-decayed top-K over a stream of keys.
+
+    Uses forward decay: an event at time t is recorded with weight
+    exp((t - landmark) / tau), so stored scores never have to be touched as
+    time passes and the decayed value at `now` is the stored score times
+    exp(-(now - landmark) / tau). The top-K is a min-heap over the sketch
+    estimates with lazily discarded stale entries.
+    """
+
+    def __init__(self, tau, top_k, width, depth, landmark=None):
+        self.tau = tau
+        self.top_k = top_k
+        self.landmark = time.time() if landmark is None else landmark
+        self.sketch = CountMinSketch(width, depth)
+        self._scores = {}
+        self._heap = []
+
+    def add(self, key, when, count=1):
+        exponent = (when - self.landmark) / self.tau
+        if exponent > _MAX_EXPONENT:
+            self._rescale(when)
+            exponent = 0.0
+        score = self.sketch.add(key, count * math.exp(exponent))
+        if key in self._scores:
+            self._scores[key] = score
+            heapq.heappush(self._heap, (score, key))
+        elif len(self._scores) < self.top_k:
+            self._scores[key] = score
+            heapq.heappush(self._heap, (score, key))
+        elif score > self._floor():
+            _, evicted = heapq.heappop(self._heap)
+            del self._scores[evicted]
+            self._scores[key] = score
+            heapq.heappush(self._heap, (score, key))
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(score, key) for key, score in self._scores.items()]
+            heapq.heapify(self._heap)
+
+    def _floor(self):
+        # Drop stale heap entries until the smallest one is current.
+        while self._heap and self._scores.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0]
+
+    def _rescale(self, when):
+        factor = math.exp(-(when - self.landmark) / self.tau)
+        self.sketch.table *= factor
+        self._scores = {key: score * factor for key, score in self._scores.items()}
+        self._heap = [(score, key) for key, score in self._scores.items()]
+        heapq.heapify(self._heap)
+        self.landmark = when
+
+    def merge(self, other):
+        """Add the counts of `other`, a tracker with the same shape and tau, to this one."""
+        landmark = max(self.landmark, other.landmark)
+        self.sketch.table = (
+            self.sketch.table * math.exp((self.landmark - landmark) / self.tau)
+            + other.sketch.table * math.exp((other.landmark - landmark) / self.tau)
+        )
+        self.landmark = landmark
+        scores = {key: self.sketch.estimate(key) for key in {*self._scores, *other._scores}}
+        self._scores = dict(heapq.nlargest(self.top_k, scores.items(), key=lambda item: item[1]))
+        self._heap = [(score, key) for key, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, limit, now=None):
+        """The `limit` heaviest keys as (key, decayed_score) pairs."""
+        now = time.time() if now is None else now
+        factor = math.exp(-(now - self.landmark) / self.tau)
+        ranked = heapq.nlargest(limit, self._scores.items(), key=lambda item: item[1])
+        return [(key, score * factor) for key, score in ranked]
+
+
+@contextmanager
+def _snapshot_lock(path):
+    """Serialise snapshot updates between processes."""
+    with open(f'{path}.lock', 'ab') as fh:
+        locks.lock(fh, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(fh)
+
+
+class TrendingTags:
+    """
+    Tag usage ranked over each window in TRENDING_TAGS_WINDOWS, fed by
+    `record` as tags are attached to posts.
+
+    Each worker process has its own engine. Besides its view of the
+    rankings, an engine keeps what it recorded since its last save, and
+    `save` merges that into the shared snapshot, so the snapshot accumulates
+    every worker's counts and each worker picks up the others' as it saves.
+    """
+
+    def __init__(self, windows=None, top_k=None, width=None, depth=None):
+        self._shape = (
+            windows or settings.TRENDING_TAGS_WINDOWS,
+            top_k or settings.TRENDING_TAGS_TOP_K,
+            width or settings.TRENDING_TAGS_SKETCH_WIDTH,
+            depth or settings.TRENDING_TAGS_SKETCH_DEPTH,
+        )
+        self.windows = self._trackers()
+        self._unsaved = self._trackers()
+        self._recorded = False
+        self.saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _trackers(self):
+        windows, top_k, width, depth = self._shape
+        return {name: DecayedHeavyHitters(tau, top_k, width, depth) for name, tau in windows.items()}
+
+    def record(self, tag_ids, when=None, count=1):
+        when = time.time() if when is None else when
+        with self._lock:
+            for trackers in (self.windows, self._unsaved):
+                for tracker in trackers.values():
+                    for tag_id in tag_ids:
+                        tracker.add(tag_id, when, count)
+            self._recorded = True
+
+    def top(self, window, limit=20):
+        with self._lock:
+            return self.windows[window].top(limit)
+
+    def save(self, path, merge=True):
+        """
+        Merge what this engine recorded since its last save into the snapshot
+        at `path` and adopt the result. With merge=False, replace the
+        snapshot with this engine's view instead (see rebuild_trending_tags).
+        """
+        with _snapshot_lock(path):
+            with self._lock:
+                if merge and not self._recorded:
+                    self.saved_at = time.monotonic()
+                    return
+                unsaved, self._unsaved, self._recorded = self._unsaved, self._trackers(), False
+                self.saved_at = time.monotonic()
+                if not merge:
+                    self._write(path, self.windows)
+                    return
+            merged = self._trackers()
+            if os.path.exists(path):
+                self._load(path, merged)
+            for name, tracker in merged.items():
+                tracker.merge(unsaved[name])
+            self._write(path, merged)
+        with self._lock:
+            # Counts recorded while the snapshot was being written stay unsaved.
+            for name, tracker in merged.items():
+                tracker.merge(self._unsaved[name])
+            self.windows = merged
+
+    def _write(self, path, trackers):
+        """Write a snapshot atomically, so a crash mid-write keeps the previous one."""
+        arrays = {}
+        for name, tracker in trackers.items():
+            arrays[f'{name}_landmark'] = np.array(tracker.landmark)
+            arrays[f'{name}_tau'] = np.array(tracker.tau)
+            arrays[f'{name}_table'] = tracker.sketch.table
+            arrays[f'{name}_keys'] = np.fromiter(tracker._scores, dtype=np.int64)
+            arrays[f'{name}_scores'] = np.fromiter(tracker._scores.values(), dtype=np.float64)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.trending-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, **arrays)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def restore(self, path):
+        """Load a snapshot written by `save`; windows whose shape or decay changed are skipped."""
+        with self._lock:
+            self._load(path, self.windows)
+
+    @staticmethod
+    def _load(path, trackers):
+        with np.load(path, allow_pickle=False) as data:
+            for name, tracker in trackers.items():
+                if f'{name}_table' not in data:
+                    continue
+                table = data[f'{name}_table']
+                if table.shape != tracker.sketch.table.shape or float(data[f'{name}_tau']) != tracker.tau:
+                    continue
+                tracker.sketch.table = table.copy()
+                tracker.landmark = float(data[f'{name}_landmark'])
+                tracker._scores = dict(zip(data[f'{name}_keys'].tolist(), data[f'{name}_scores'].tolist()))
+                tracker._heap = [(score, key) for key, score in tracker._scores.items()]
+                heapq.heapify(tracker._heap)
+
+    def maybe_save(self, path):
+        if time.monotonic() - self.saved_at >= settings.TRENDING_TAGS_SNAPSHOT_INTERVAL:
+            self.save(path)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def trending_tags():
+    """This process's engine, restored from the last snapshot on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = TrendingTags()
+                path = settings.TRENDING_TAGS_SNAPSHOT_PATH
+                if path and os.path.exists(path):
+                    engine.restore(path)
+                if path:
+                    # Merges like every save, so it never overwrites newer snapshots.
+                    atexit.register(engine.save, path)
+                _engine = engine
+    return _engine
+
+
+def record_tags(tag_ids, when=None):
+    engine = trending_tags()
+    engine.record(tag_ids, when)
+    if settings.TRENDING_TAGS_SNAPSHOT_PATH:
+        engine.maybe_save(settings.TRENDING_TAGS_SNAPSHOT_PATH)
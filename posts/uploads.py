@@ -0,0 +1,115 @@
+import os
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.db import transaction
+from django.utils import timezone
+
+from mediastore.storage import atomic_files, file_digest
+from .models import PostMedia, UploadSession
+
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class PartMissing(Exception):
+    """The part file is gone, e.g. moved into storage by an attempt that then failed."""
+
+
+class AlreadyFinalized(Exception):
+    pass
+
+
+class SessionFile(File):
+    """
+    The assembled part file. Exposing `temporary_file_path` and `sha256` lets
+    content-addressed storage rename it into place without reading it again.
+    """
+
+    def __init__(self, file, name, sha256):
+        super().__init__(file, name)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Write up to `length` bytes from `stream` at `offset` and return the new
+    offset. The part file is locked for the duration, and the offset must
+    match what has been received so far; a chunk cut short by a dropped
+    connection still counts for the bytes that arrived.
+    """
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    fd = os.open(session.path, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'r+b') as part:
+        locks.lock(part, locks.LOCK_EX)
+        try:
+            # Re-read under the lock: a concurrent chunk may have advanced it.
+            current = UploadSession.objects.values_list('offset', flat=True).get(pk=session.pk)
+            if offset != current:
+                raise OffsetMismatch(current)
+            part.seek(offset)
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                part.write(data)
+                remaining -= len(data)
+            received = offset + length - remaining
+            part.truncate(received)
+            UploadSession.objects.filter(pk=session.pk).update(offset=received, updated_at=timezone.now())
+            session.offset = received
+        finally:
+            locks.unlock(part)
+    return session.offset
+
+
+def finalize(session):
+    """
+    Verify the assembled file and turn it into a PostMedia, moving rather than
+    copying it. Deleting the session row claims it, so of concurrent calls
+    only one proceeds, and a failure rolls the claim back.
+    """
+    try:
+        with transaction.atomic():
+            if not UploadSession.objects.filter(pk=session.pk, offset=session.size).delete()[0]:
+                raise AlreadyFinalized()
+            try:
+                part = open(session.path, 'rb')
+            except FileNotFoundError:
+                raise PartMissing()
+            with part, atomic_files():
+                digest = file_digest(session.path)
+                if digest != session.sha256:
+                    raise ChecksumMismatch(digest)
+                media = PostMedia(post_id=session.post_id, media_type=session.media_type, order=session.order)
+                media.file.save(session.filename, SessionFile(part, session.filename, digest), save=False)
+                media.save()
+    except (ChecksumMismatch, PartMissing):
+        # Corrupted or lost along the way: make the client start over.
+        if os.path.exists(session.path):
+            os.remove(session.path)
+        UploadSession.objects.filter(pk=session.pk).update(offset=0)
+        raise
+    if os.path.exists(session.path):
+        # Identical content was already stored, so the part file wasn't needed.
+        os.remove(session.path)
+    return media
+
+
+def discard(session):
+    if os.path.exists(session.path):
+        os.remove(session.path)
+    session.delete()